@@ -36,7 +36,7 @@ setup(
     #
     # install the executable
     entry_points = {
-        'console_scripts': ['tstables_benchmark = tstables.Benchmark:main']
+        'console_scripts': ['tstables_benchmark = tstables.benchmark:Benchmark.main']
     },
 
     # Dependencies
@@ -45,7 +45,19 @@ setup(
     # side, a version on the right-hand side, and a comparison 
     # operator between them, e.g. == exact version, >= this version
     # or higher
-    install_requires = ['tables>=3.1.1', 'pandas>=0.13.1'],
+    # zoneinfo needs Python 3.9, and tzdata provides the time zone database where the system
+    # doesn't have one
+    python_requires = '>=3.9',
+    install_requires = ['tables>=3.1.1', 'tzdata; sys_platform == "win32"'],
+
+    # Optional dependencies: pandas for DataFrames (the default output of reads), pyarrow for
+    # Arrow output and Parquet ingestion, and Dask for TsTable.to_dask
+    extras_require = {
+        'pandas': ['pandas>=0.13.1'],
+        'arrow': ['pyarrow'],
+        'parquet': ['pyarrow'],
+        'dask': ['dask[dataframe]'],
+    },
 
     # Tests
     #
@@ -25,9 +25,26 @@ from tstables.file import create_ts
 from tstables.group import timeseries_repr
 from tstables.group import timeseries_str
 from tstables.group import get_timeseries
-from tstables.benchmark import Benchmark
+from tstables.cache import PartitionCache
+import importlib
 import tables
 
+# These are imported on first use, so that `import tstables` doesn't pay for asyncio, process pools
+# or pandas (which the benchmark uses) unless they are needed.
+_LAZY_ATTRIBUTES = {
+    'Benchmark': 'tstables.benchmark',
+    'AsyncTsTable': 'tstables.aio',
+    'TsStore': 'tstables.store',
+    'bulk_load': 'tstables.bulk',
+    'pipelined_append': 'tstables.bulk',
+    'PrefetchingReader': 'tstables.prefetch',
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]),name)
+    raise AttributeError("module 'tstables' has no attribute %r" % name)
+
 # Augment the PyTables File class
 tables.File.create_ts = create_ts
 
@@ -0,0 +1,117 @@
+import asyncio
+import concurrent.futures
+import functools
+import threading
+
+import numpy
+
+from tstables import arrow
+from tstables.locks import file_lock
+
+# Guards the creation of the shared default executor
+_default_executor_lock = threading.Lock()
+
+class AsyncTsTable:
+    """An asyncio facade over a TsTable
+
+    HDF5 work runs on an executor so it does not block the event loop, and each call holds the lock
+    of the underlying file while it touches it. Range reads step through the time series one
+    partition per executor call, so a cancelled read stops at the next partition boundary.
+
+    By default, all instances share a single-threaded executor. HDF5 is generally not built to be
+    thread safe, so only pass an executor with more workers if your HDF5 library is.
+
+    Example::
+
+        ats = tstables.AsyncTsTable(f.root.EURUSD._f_get_timeseries())
+        rows = await ats.read_range(start_dt,end_dt)
+        async for chunk in ats.iter_range(start_dt,end_dt):
+            ...
+    """
+
+    _default_executor = None
+
+    def __init__(self,ts_table,executor=None):
+        self.ts_table = ts_table
+        self.executor = executor or AsyncTsTable.default_executor()
+        self.lock = file_lock(ts_table.file)
+
+    @classmethod
+    def default_executor(cls):
+        with _default_executor_lock:
+            if cls._default_executor is None:
+                cls._default_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                    thread_name_prefix='tstables')
+            return cls._default_executor
+
+    def __locked(self,fn,*args,**kwargs):
+        with self.lock:
+            return fn(*args,**kwargs)
+
+    def __run(self,fn,*args,**kwargs):
+        """Runs fn on the executor while holding the file lock, and returns an awaitable result
+        """
+
+        loop = asyncio.get_running_loop()
+        return loop.run_in_executor(self.executor,
+            functools.partial(self.__locked,fn,*args,**kwargs))
+
+    async def iter_range(self,start_dt,end_dt,as_pandas_dataframe=True,output=None,where=None):
+        """Asynchronously yields the rows between start_dt and end_dt one partition at a time
+        """
+
+        chunks = await self.__run(self.ts_table.iter_range,start_dt,end_dt,as_pandas_dataframe,
+                                  output,where)
+        try:
+            while True:
+                rows = await self.__run(next,chunks,None)
+                if rows is None:
+                    break
+                yield rows
+        finally:
+            # The generator might still be running on the executor if we were cancelled, so close it
+            # there (after any step in flight) rather than here.
+            self.executor.submit(self.__locked,chunks.close)
+
+    async def read_range(self,start_dt,end_dt,as_pandas_dataframe=True,output=None,where=None):
+        output = self.ts_table._TsTable__output_format(as_pandas_dataframe,output)
+
+        chunks = []
+        async for rows in self.iter_range(start_dt,end_dt,output='numpy',where=where):
+            chunks.append(rows)
+
+        # Assembling the result doesn't touch the file, so it runs on the executor without the lock
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor,
+            functools.partial(self.__assemble,chunks,output))
+
+    def __assemble(self,chunks,output):
+        dtype = self.ts_table._TsTable__v_dtype()
+
+        if output == 'arrow':
+            return arrow.rows_to_table(chunks,arrow.schema_from_dtype(dtype))
+
+        result = numpy.concatenate([numpy.ndarray(shape=0,dtype=dtype)] + chunks)
+
+        if output == 'pandas':
+            result = self.ts_table._TsTable__to_dataframe(result)
+
+        return result
+
+    async def append(self,rows,convert_strings=False,on_overlap='raise'):
+        return await self.__run(self.ts_table.append,rows,convert_strings,on_overlap)
+
+    async def read_last(self,n,as_pandas_dataframe=True):
+        return await self.__run(self.ts_table.read_last,n,as_pandas_dataframe)
+
+    async def read_first(self,n,as_pandas_dataframe=True):
+        return await self.__run(self.ts_table.read_first,n,as_pandas_dataframe)
+
+    async def read_asof(self,timestamps,as_pandas_dataframe=True):
+        return await self.__run(self.ts_table.read_asof,timestamps,as_pandas_dataframe)
+
+    async def min_dt(self):
+        return await self.__run(self.ts_table.min_dt)
+
+    async def max_dt(self):
+        return await self.__run(self.ts_table.max_dt)
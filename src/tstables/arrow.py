@@ -0,0 +1,50 @@
+import numpy
+
+def _pyarrow():
+    try:
+        import pyarrow
+    except ImportError:
+        raise ImportError("output='arrow' requires pyarrow")
+    return pyarrow
+
+def schema_from_dtype(dtype):
+    """Returns the Arrow schema for rows of a time series with the given dtype
+
+    The int64 timestamp column becomes a `timestamp[ms, tz=UTC]` column.
+    """
+
+    pyarrow = _pyarrow()
+    fields = [pyarrow.field('timestamp',pyarrow.timestamp('ms',tz='UTC'),nullable=False)]
+    for name in dtype.names[1:]:
+        fields.append(pyarrow.field(name,pyarrow.from_numpy_dtype(dtype[name]),nullable=False))
+
+    return pyarrow.schema(fields)
+
+def rows_to_record_batch(rows,schema):
+    """Converts a structured array of rows to a pyarrow RecordBatch
+
+    Each column of `rows` is copied once into contiguous memory (unless it already is contiguous),
+    and Arrow arrays are then built on top of those buffers without copying again. The timestamp
+    column is reinterpreted as a timestamp array, which doesn't copy either.
+    """
+
+    pyarrow = _pyarrow()
+
+    arrays = []
+    for name,field in zip(rows.dtype.names,schema):
+        column = numpy.ascontiguousarray(rows[name])
+        if name == 'timestamp':
+            arrays.append(pyarrow.array(column,type=pyarrow.int64()).view(field.type))
+        else:
+            arrays.append(pyarrow.array(column,type=field.type))
+
+    return pyarrow.RecordBatch.from_arrays(arrays,schema=schema)
+
+def rows_to_table(chunks,schema):
+    """Converts a list of structured arrays (one per partition) to a pyarrow Table, without
+    concatenating them first
+    """
+
+    pyarrow = _pyarrow()
+    return pyarrow.Table.from_batches([rows_to_record_batch(rows,schema) for rows in chunks],
+                                      schema=schema)
@@ -82,6 +82,13 @@ class Benchmark:
 
         cls.log_me("average time to read one hour of data (100 repetitions): {0} seconds\n".format(read_time))
 
+        # Repeat with a partition cache, so that reads of the same day are served from memory
+        ts.cache = tstables.PartitionCache()
+        read_time = timeit.timeit(lambda: read_random_hour(ts, min_dt, max_dt), number=100)
+
+        cls.log_me("average time to read one hour of data with a partition cache (100 repetitions): "
+                   "{0} seconds\n".format(read_time))
+
 
     @classmethod
     def main(cls):
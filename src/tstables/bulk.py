@@ -0,0 +1,263 @@
+import collections
+import concurrent.futures
+import os
+import queue
+import tempfile
+import threading
+
+import numpy
+import tables
+
+from tstables import locks
+
+def _build_partitions(tmp_dir,rows,dtype,filters,expectedrows_per_partition,chunkshape,byteorder,
+    partition_offset,partition_tz,timestamp_encoding,indexed_columns,convert_strings):
+    """Builds complete day partitions from rows in a new temporary file and returns its path.
+    Runs in a worker process.
+
+    The partitions are built the way the series builds them, with its filters, chunk shape,
+    timestamp encoding and index summaries, so that the writer can copy their compressed chunks
+    without decoding them (see `_attach_partitions`).
+    """
+
+    fd,tmp_path = tempfile.mkstemp('.h5',dir=tmp_dir)
+    os.close(fd)
+
+    try:
+        with tables.open_file(tmp_path,'w') as h5_file:
+            ts = h5_file.create_ts('/','ts',description=dtype,filters=filters,
+                expectedrows_per_partition=expectedrows_per_partition,chunkshape=chunkshape,
+                byteorder=byteorder,partition_offset=partition_offset,partition_tz=partition_tz,
+                timestamp_encoding=timestamp_encoding,indexed_columns=indexed_columns)
+            ts.append(rows,convert_strings)
+    except:
+        os.remove(tmp_path)
+        raise
+
+    return tmp_path
+
+def _timestamps_of(rows):
+    if hasattr(rows,'index') and hasattr(rows,'iloc'):
+        # A pandas DataFrame with a DatetimeIndex
+        return rows.index.values.astype('datetime64[ms]').view(numpy.int64)
+    else:
+        return numpy.asarray(rows)['timestamp']
+
+def _slice_of(rows,start,stop):
+    if hasattr(rows,'iloc'):
+        return rows.iloc[start:stop]
+    else:
+        return rows[start:stop]
+
+def bulk_load(ts,batches,processes=None,rows_per_task=1000000,convert_strings=False,tmp_dir=None):
+    """Appends a large amount of data to a time series using a pool of worker processes
+
+    `batches` is a DataFrame or structured array, as accepted by `TsTable.append`, or an iterable of
+    them in chronological order (for example, one per vendor file). Each batch is split into tasks
+    of whole day partitions with about `rows_per_task` rows. Worker processes convert and validate
+    the rows of a task and build and compress its partitions in a temporary file, and the calling
+    process then copies the finished partitions to `ts`, in order. At most two tasks per worker are
+    in flight, which bounds the memory and temporary disk space used.
+
+    `processes` defaults to the number of CPUs.
+    """
+
+    if hasattr(batches,'dtype') or hasattr(batches,'iloc'):
+        batches = [batches]
+
+    processes = processes or os.cpu_count()
+    dtype = ts._TsTable__v_dtype()
+
+    # Partition tables created without filters inherit those of the series group
+    filters = ts.table_filters if ts.table_filters is not None else ts.root_group._v_filters
+    last_ts = ts._TsTable__get_max_ts()
+
+    pending = collections.deque()
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        try:
+            for rows in batches:
+                if len(rows) == 0:
+                    continue
+
+                timestamps = _timestamps_of(rows)
+
+                # Workers only see their own rows, so check the order between tasks here
+                if last_ts is not None and timestamps[0] < last_ts:
+                    raise ValueError("rows start prior to the end of existing rows, so they cannot "
+                                     "be appended.")
+                last_ts = timestamps[-1]
+
+                for start,stop in _task_bounds(ts,timestamps,rows_per_task):
+                    pending.append(executor.submit(_build_partitions,tmp_dir,
+                        _slice_of(rows,start,stop),dtype,filters,ts.table_expectedrows,
+                        ts.table_chunkshape,ts.table_byteorder,ts.partition_offset,ts.partition_tz,
+                        ts.timestamp_encoding,ts.indexed_columns,convert_strings))
+
+                    while len(pending) > 2*processes:
+                        _attach_partitions(ts,pending.popleft().result())
+
+            while pending:
+                _attach_partitions(ts,pending.popleft().result())
+        finally:
+            # Clean up after tasks that won't be attached because of an error
+            for future in pending:
+                future.cancel()
+                if not future.cancelled() and future.exception() is None:
+                    os.remove(future.result())
+
+def _task_bounds(ts,timestamps,rows_per_task):
+    """Splits sorted timestamps into (start, stop) row ranges made of whole partitions
+    """
+
+    if not ts._TsTable__is_sorted(timestamps):
+        raise ValueError("timestamp column must be sorted in ascending order.")
+
+    sorted_pkeys,split_on_idx = ts._TsTable__partition_splits(timestamps)
+
+    bounds = []
+    start = 0
+    for stop in split_on_idx:
+        if stop - start >= rows_per_task:
+            bounds.append((start,stop))
+            start = stop
+
+    if start < len(timestamps):
+        bounds.append((start,len(timestamps)))
+
+    return bounds
+
+def _attach_partitions(ts,tmp_path):
+    """Appends the partitions built by a worker to the time series, and removes the worker file
+    """
+
+    try:
+        with tables.open_file(tmp_path,'r') as h5_file:
+            worker_ts = h5_file.root.ts._f_get_timeseries()
+            for partition_dt,ts_data in worker_ts._TsTable__iter_nonempty_tables():
+                target = ts._TsTable__fetch_or_create_partition_table(partition_dt)
+                if _can_copy_chunks(target,ts_data):
+                    _copy_partition(ts,worker_ts,partition_dt,target,ts_data)
+                else:
+                    ts._TsTable__append_rows_to_partition(partition_dt,
+                        worker_ts._TsTable__read_table(ts_data))
+    finally:
+        os.remove(tmp_path)
+
+def _can_copy_chunks(target,source):
+    """Returns True if the chunks of a worker's partition table can be copied as they are into an
+    empty partition table of the series
+    """
+
+    return (hasattr(target,'write_chunk') and target.nrows == 0 and
+            target.dtype == source.dtype and target.chunkshape == source.chunkshape and
+            target.filters == source.filters and
+            getattr(target.attrs,'_TS_TABLES_TIMESTAMP_BASE',None) ==
+                getattr(source.attrs,'_TS_TABLES_TIMESTAMP_BASE',None))
+
+def _copy_partition(ts,worker_ts,partition_dt,target,source):
+    """Copies a worker's partition into an empty partition of the series, chunk by chunk, without
+    decompressing it
+    """
+
+    # Index summaries first, as TsTable.append does
+    for column in ts.indexed_columns:
+        summary = worker_ts._TsTable__index_summary(source,column)
+        if summary is not None:
+            ts._TsTable__set_index_summary(target,column,summary)
+
+    # Grow the table without writing any rows, then write the chunks that hold them
+    target.truncate(source.nrows)
+    for start in range(0,source.nrows,source.chunkshape[0]):
+        info = source.chunk_info((start,))
+        target.write_chunk((start,),source.read_chunk((start,)),info.filter_mask)
+
+    if ts.cache is not None:
+        ts.cache.invalidate(ts._TsTable__cache_key(partition_dt))
+
+def pipelined_append(ts,batches,convert_strings=False,queue_size=2,blosc_threads=None):
+    """Appends batches of rows to a time series, converting the next batch while the current one is
+    written
+
+    `batches` is anything `TsTable.append` accepts, or an iterable of them in chronological order.
+    A background thread converts each batch to the table dtype, validates it and splits it into
+    partitions, without touching the HDF5 file. The calling thread writes the split batches, and at
+    most `queue_size` converted batches wait between the two, which bounds memory use.
+
+    If the series is compressed with Blosc, Blosc uses `blosc_threads` threads (by default, one per
+    CPU) during the load.
+    """
+
+    if hasattr(batches,'dtype') or hasattr(batches,'iloc') or isinstance(batches,dict):
+        batches = [batches]
+
+    lock = locks.file_lock(ts.file)
+    with lock:
+        last_ts = ts._TsTable__get_max_ts()
+
+    converted = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def put(item):
+        # Give up if the writer has stopped, rather than block forever on a full queue
+        while not stop.is_set():
+            try:
+                converted.put(item,timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def convert():
+        try:
+            prev_ts = last_ts
+            for rows in batches:
+                if stop.is_set():
+                    return
+
+                rows = ts._TsTable__prepare_rows(rows,convert_strings)
+                if rows.size == 0:
+                    continue
+
+                timestamps = rows['timestamp']
+                if not ts._TsTable__is_sorted(timestamps):
+                    raise ValueError("timestamp column must be sorted in ascending order.")
+                if prev_ts is not None and timestamps[0] < prev_ts:
+                    raise ValueError("rows start prior to the end of existing rows, so they cannot "
+                                     "be appended.")
+                prev_ts = timestamps[-1]
+
+                sorted_pkeys,split_on_idx = ts._TsTable__partition_splits(timestamps)
+                put(list(zip(sorted_pkeys,numpy.split(rows,split_on_idx))))
+        except BaseException as exc:
+            put(exc)
+        else:
+            put(None)
+
+    # Partition tables created without filters inherit those of the series group
+    filters = ts.table_filters if ts.table_filters is not None else ts.root_group._v_filters
+    if blosc_threads is None and filters.complib is not None and filters.complib.startswith('blosc'):
+        blosc_threads = os.cpu_count()
+
+    previous_threads = None
+    if blosc_threads is not None:
+        previous_threads = tables.set_blosc_max_threads(blosc_threads)
+
+    converter = threading.Thread(target=convert,name='tstables-convert',daemon=True)
+    converter.start()
+
+    try:
+        while True:
+            item = converted.get()
+            if item is None:
+                break
+            if isinstance(item,BaseException):
+                raise item
+
+            for partition_dt,rows in item:
+                with lock:
+                    ts._TsTable__append_rows_to_partition(partition_dt,rows)
+    finally:
+        stop.set()
+        converter.join()
+        if previous_threads is not None:
+            tables.set_blosc_max_threads(previous_threads)
@@ -0,0 +1,70 @@
+import collections
+import threading
+
+class PartitionCache:
+    """An in-process LRU cache of decoded partition arrays, bounded by a memory budget
+
+    Assign an instance to `TsTable.cache` (one cache can be shared by several time series) and
+    `read_range` will keep the partitions it reads in memory. Appending to a partition evicts just
+    that partition, so the other cached partitions stay valid.
+
+    Cached arrays are marked read-only, since they are handed out to every reader.
+    """
+
+    def __init__(self,max_bytes=256*1024*1024):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.__entries = collections.OrderedDict()
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self,key):
+        """Returns the cached array for key (marking it as recently used), or `None`
+        """
+
+        with self.__lock:
+            rows = self.__entries.get(key)
+            if rows is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.__entries.move_to_end(key)
+            return rows
+
+    def put(self,key,rows):
+        """Caches rows under key, evicting the least recently used arrays to stay within max_bytes
+
+        Arrays larger than the whole budget are not cached.
+        """
+
+        if rows.nbytes > self.max_bytes:
+            return
+
+        rows.flags.writeable = False
+
+        with self.__lock:
+            self.__discard(key)
+            self.__entries[key] = rows
+            self.nbytes += rows.nbytes
+
+            while self.nbytes > self.max_bytes:
+                evicted_key,evicted = self.__entries.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def invalidate(self,key):
+        with self.__lock:
+            self.__discard(key)
+
+    def clear(self):
+        with self.__lock:
+            self.__entries.clear()
+            self.nbytes = 0
+
+    def __discard(self,key):
+        rows = self.__entries.pop(key,None)
+        if rows is not None:
+            self.nbytes -= rows.nbytes
@@ -0,0 +1,82 @@
+import datetime
+import os
+import weakref
+
+import tables
+
+from tstables import locks
+
+# Files that to_dask was called on in this process, keyed by absolute path. Tasks that run in this
+# process (on the synchronous or threaded scheduler) read through these handles, because HDF5 won't
+# open a file read-only while it is open for writing.
+_open_files = weakref.WeakValueDictionary()
+
+def _read_rows(h5_file,node_path,bounds):
+    import tstables
+
+    start_ts,end_ts = bounds
+    ts = h5_file.get_node(node_path)._f_get_timeseries()
+    return ts.read_range(tstables.TsTable._TsTable__ts_to_dt(start_ts),
+                         tstables.TsTable._TsTable__ts_to_dt(end_ts))
+
+def _read_partition(bounds,path,node_path,selected_columns):
+    """Reads the rows of one tstables partition as a DataFrame. Runs as a Dask task, possibly in
+    another process, where it opens the file itself.
+
+    (The column argument isn't called `columns`, because Dask passes that to functions that
+    accept it.)
+    """
+
+    h5_file = _open_files.get(path)
+    if h5_file is not None and h5_file.isopen:
+        with locks.file_lock(h5_file):
+            df = _read_rows(h5_file,node_path,bounds)
+    else:
+        with tables.open_file(path,'r') as h5_file:
+            df = _read_rows(h5_file,node_path,bounds)
+
+    return df if selected_columns is None else df[selected_columns]
+
+def to_dask(ts,start_dt,end_dt,columns=None):
+    """Returns a Dask DataFrame of the rows between start_dt and end_dt, with one Dask partition (and
+    one task) per tstables partition. See `TsTable.to_dask`.
+    """
+
+    try:
+        import dask.dataframe
+    except ImportError:
+        raise ImportError('to_dask requires dask[dataframe]')
+    import pandas
+
+    start_dt,end_dt = ts._TsTable__utc_range(start_dt,end_dt)
+    start_ts = ts._TsTable__dt_to_ts(start_dt)
+    end_ts = ts._TsTable__dt_to_ts(end_dt)
+
+    meta = ts._TsTable__to_dataframe(ts._TsTable__rows_from_chunks([],False))
+    if columns is not None:
+        meta = meta[columns]
+
+    # The part of the range in each partition that has rows
+    bounds = []
+    for partition_dt,ts_data,covered in ts._TsTable__iter_partitions_in_range(start_ts,end_ts):
+        if ts_data.nrows > 0:
+            p_start_ts = ts._TsTable__partition_start_ts(partition_dt)
+            bounds.append((max(start_ts,p_start_ts),min(end_ts,ts._TsTable__partition_start_ts(
+                partition_dt + datetime.timedelta(days=1)) - 1)))
+
+    if not bounds:
+        return dask.dataframe.from_pandas(meta,npartitions=1)
+
+    # Tasks in other processes open the file separately, so they must see everything written so far
+    ts.file.flush()
+    path = os.path.abspath(ts.file.filename)
+    _open_files[path] = ts.file
+
+    # Each Dask partition starts where its tstables partition (clipped to the range) does, and the
+    # last one ends at the end of the last partition
+    divisions = [pandas.Timestamp(lo,unit='ms') for lo,hi in bounds]
+    divisions.append(pandas.Timestamp(bounds[-1][1],unit='ms'))
+
+    return dask.dataframe.from_map(_read_partition,bounds,
+        args=[path,ts.root_group._v_pathname,columns],
+        meta=meta,divisions=divisions,enforce_metadata=False)
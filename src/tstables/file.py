@@ -2,22 +2,60 @@ import tables
 import tstables
 import datetime
 import numpy
+import zoneinfo
 
 def create_ts(self,where,name,description=None,title="",filters=None,
     expectedrows_per_partition=10000,chunkshape=None,
-    byteorder=None,createparents=False):
+    byteorder=None,createparents=False,partition_offset=None,partition_tz=None,
+    timestamp_encoding=None,indexed_columns=None):
+    """Creates a new time series at `where`/`name`
+
+    Rows are partitioned by day. By default, a partition runs from midnight to midnight UTC. Pass
+    `partition_tz` (a time zone name) to use midnight in that time zone, and `partition_offset` (a
+    timedelta of less than a day) to move the start of each partition, so that a partition can hold
+    exactly one trading session. For example, partition_tz='America/New_York' and
+    partition_offset=timedelta(hours=-7) gives partitions from 17:00 to 17:00 New York time, each
+    named after the day the session ends.
+
+    With `timestamp_encoding='offset32'`, timestamps are stored in each partition as int32
+    millisecond offsets from the start of the partition, which halves the size of the timestamp
+    column. Rows are still read and appended with int64 timestamps. Combine it with the shuffle
+    filter (the default for compressed `filters`) to compress the offsets well.
+
+    `indexed_columns` is a list of columns to keep a per-partition summary of: the distinct values
+    of the column, or a Bloom filter of them once there are many. `read_range(..., where=...)` uses
+    them to skip partitions that can't have matching rows.
+    """
+
+    # The description can also be a NumPy dtype, as for File.create_table
+    if isinstance(description, numpy.dtype):
+        description = tables.description.descr_from_dtype(description)[0]
 
     # Check the Description to make sure the first col is "timestamp" with type Int64
-    for k in description.columns.keys():
-        if description.columns[k]._v_pos == 0:
-            first_col_name = k
+    dtype = tables.description.dtype_from_descr(description)
 
-    if first_col_name != 'timestamp':
+    if dtype.names[0] != 'timestamp':
         raise AttributeError("first column must be called 'timestamp' and have type Int64")
 
-    if description.columns[first_col_name].dtype != numpy.dtype('int64'):
+    if dtype[0] != numpy.dtype('int64'):
         raise AttributeError("first column must be called 'timestamp' and have type Int64")
 
+    if partition_offset is not None and abs(partition_offset) >= datetime.timedelta(days=1):
+        raise AttributeError("partition_offset must be less than one day")
+
+    if partition_tz is not None:
+        try:
+            zoneinfo.ZoneInfo(partition_tz)
+        except (zoneinfo.ZoneInfoNotFoundError,ValueError):
+            raise AttributeError("unknown time zone '%s'" % partition_tz)
+
+    if timestamp_encoding not in (None,'offset32'):
+        raise AttributeError("timestamp_encoding must be None or 'offset32'")
+
+    for column in (indexed_columns or []):
+        if column not in dtype.names[1:]:
+            raise AttributeError("cannot index column '%s'" % column)
+
     # The parent node of the time series
     tsnode = self.create_group(where,name,title,filters,createparents)
 
@@ -26,8 +64,28 @@ def create_ts(self,where,name,description=None,title="",filters=None,
         tsnode._v_attrs._TS_TABLES_CLASS='TIMESERIES'
         tsnode._v_attrs._TS_TABLES_VERSION='0.0.1'
 
+        # Partition boundaries are a property of the stored data, so they're saved with it
+        if partition_offset is not None:
+            tsnode._v_attrs._TS_TABLES_PARTITION_OFFSET=int(partition_offset.total_seconds()*1000)
+        if partition_tz is not None:
+            tsnode._v_attrs._TS_TABLES_PARTITION_TZ=partition_tz
+        if timestamp_encoding is not None:
+            tsnode._v_attrs._TS_TABLES_TIMESTAMP_ENCODING=timestamp_encoding
+        if indexed_columns:
+            tsnode._v_attrs._TS_TABLES_INDEXED_COLUMNS=list(indexed_columns)
+
+        # The schema and table settings, so that the time series can be opened without reading a
+        # partition (the title and filters are those of tsnode)
+        tsnode._v_attrs._TS_TABLES_DTYPE=repr(numpy.lib.format.dtype_to_descr(dtype))
+        tsnode._v_attrs._TS_TABLES_EXPECTEDROWS_PER_PARTITION=expectedrows_per_partition
+        if chunkshape is not None:
+            tsnode._v_attrs._TS_TABLES_CHUNKSHAPE=list(numpy.atleast_1d(chunkshape))
+        if byteorder is not None:
+            tsnode._v_attrs._TS_TABLES_BYTEORDER=byteorder
+
         ts = tstables.TsTable(self,tsnode,description,title,filters,expectedrows_per_partition,
-            chunkshape,byteorder)
+            chunkshape,byteorder,partition_offset=partition_offset,partition_tz=partition_tz,
+            timestamp_encoding=timestamp_encoding,indexed_columns=indexed_columns)
 
         # Need to create one partition to "save" the time series. This creates a new table to persist
         # the table description
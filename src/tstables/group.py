@@ -1,6 +1,8 @@
+import ast
 import tables
 import tstables
 import datetime
+import numpy
 
 def timeseries_repr(self):
 	"""Return a detailed string representation of the group or time series.
@@ -76,16 +78,42 @@ def get_timeseries(self):
 	except AttributeError:
 		return None
 
-	ts_table = tstables.TsTable(self._v_file,self,None)
-
-	# Need to determine the description, title, filters, expectedrows_per_partition,
-	# chunkshape, byteorder
+	# Partition boundaries, which default to UTC midnight for series created without them
+	partition_offset = getattr(self._v_attrs,'_TS_TABLES_PARTITION_OFFSET',None)
+	if partition_offset is not None:
+		partition_offset = datetime.timedelta(milliseconds=int(partition_offset))
+
+	ts_table = tstables.TsTable(self._v_file,self,None,partition_offset=partition_offset,
+		partition_tz=getattr(self._v_attrs,'_TS_TABLES_PARTITION_TZ',None),
+		timestamp_encoding=getattr(self._v_attrs,'_TS_TABLES_TIMESTAMP_ENCODING',None),
+		indexed_columns=getattr(self._v_attrs,'_TS_TABLES_INDEXED_COLUMNS',None))
+
+	dtype = getattr(self._v_attrs,'_TS_TABLES_DTYPE',None)
+	if dtype is not None:
+		# The schema and table settings were saved by create_ts, so no partition needs to be opened
+		dtype = numpy.lib.format.descr_to_dtype(ast.literal_eval(dtype))
+		ts_table.table_description = tables.description.descr_from_dtype(dtype)[0]
+		ts_table.table_title = self._v_title
+		ts_table.table_filters = self._v_filters
+		ts_table.table_expectedrows = int(self._v_attrs._TS_TABLES_EXPECTEDROWS_PER_PARTITION)
+		chunkshape = getattr(self._v_attrs,'_TS_TABLES_CHUNKSHAPE',None)
+		ts_table.table_chunkshape = None if chunkshape is None else tuple(int(c) for c in chunkshape)
+		ts_table.table_byteorder = getattr(self._v_attrs,'_TS_TABLES_BYTEORDER',None)
+		return ts_table
+
+	# Series created by older versions don't have them. Need to determine the description, title,
+	# filters, expectedrows_per_partition, chunkshape, byteorder from the first partition.
 	ts_data = ts_table._TsTable__fetch_first_table()
 	ts_table.table_description = ts_data.description
+	if ts_table.timestamp_encoding is not None:
+		# Rows have int64 timestamps, whatever type the partition tables store them as
+		dtype = ts_data.description._v_dtype
+		ts_table.table_description = tables.description.descr_from_dtype(numpy.dtype(
+			[('timestamp',numpy.int64)] + [(name,dtype[name]) for name in dtype.names[1:]]))[0]
 	ts_table.table_title = ts_data.title
 	ts_table.table_filters = ts_data.filters
 	ts_table.table_chunkshape = ts_data.chunkshape
 	ts_table.table_byteorder = ts_data.byteorder
-	ts_table.table_expectedrows_per_partition = ts_data.attrs._TS_TABLES_EXPECTEDROWS_PER_PARTITION
+	ts_table.table_expectedrows = ts_data.attrs._TS_TABLES_EXPECTEDROWS_PER_PARTITION
 
 	return ts_table
\ No newline at end of file
@@ -0,0 +1,79 @@
+import numpy
+
+# A partition column is summarized by its distinct values until it has more than this many, and by a
+# Bloom filter after that
+MAX_DISTINCT_VALUES = 1000
+
+# Bloom filter size and number of hash functions. With 10 bits per value and 7 hashes, about 1% of
+# the partitions that don't contain a value are still read.
+BLOOM_BITS_PER_VALUE = 10
+BLOOM_HASHES = 7
+
+_FNV_OFFSET = numpy.uint64(14695981039346656037)
+_FNV_PRIME = numpy.uint64(1099511628211)
+
+def _normalize(values):
+    values = numpy.ascontiguousarray(values)
+    if values.dtype.kind == 'f':
+        # -0.0 == 0.0, but their bytes differ
+        values = values + 0.0
+    return values
+
+def _bloom_positions(values,n_bits):
+    """Returns the BLOOM_HASHES bit positions of each value, as an array of shape (len(values), k)
+
+    Values are hashed from their bytes with FNV-1a, one byte column at a time for all values at once,
+    and the k positions are derived from that hash by double hashing.
+    """
+
+    data = values.view(numpy.uint8).reshape(len(values),-1)
+
+    h1 = numpy.full(len(values),_FNV_OFFSET,dtype=numpy.uint64)
+    for i in range(data.shape[1]):
+        h1 = (h1 ^ data[:,i]) * _FNV_PRIME
+    h2 = (h1 >> numpy.uint64(32)) | numpy.uint64(1)
+
+    k = numpy.arange(BLOOM_HASHES,dtype=numpy.uint64)
+    return (h1[:,None] + k[None,:] * h2[:,None]) % numpy.uint64(n_bits)
+
+def _bloom_add(bits,values):
+    positions = _bloom_positions(values,bits.size*8).ravel()
+    numpy.bitwise_or.at(bits,(positions >> numpy.uint64(3)).astype(numpy.intp),
+                        (numpy.uint8(1) << (positions & numpy.uint64(7)).astype(numpy.uint8)))
+
+def update_summary(summary,values,expected_values):
+    """Returns the summary of a partition column after `values` are appended to it
+
+    A summary is ('distinct', sorted array of distinct values) or ('bloom', array of filter bytes).
+    `expected_values` sizes the Bloom filter when a summary switches to one.
+    """
+
+    values = _normalize(values)
+    kind,data = summary
+
+    if kind == 'distinct':
+        distinct = numpy.union1d(data.astype(values.dtype),values)
+        if distinct.size <= MAX_DISTINCT_VALUES:
+            return ('distinct',distinct)
+
+        n_bytes = (max(expected_values,distinct.size)*BLOOM_BITS_PER_VALUE + 7) // 8
+        kind,data,values = 'bloom',numpy.zeros(n_bytes,dtype=numpy.uint8),distinct
+    else:
+        data = data.copy()
+
+    _bloom_add(data,values)
+    return ('bloom',data)
+
+def may_contain(summary,value,dtype):
+    """Returns False if a partition column with this summary certainly has no row equal to `value`
+    """
+
+    value = _normalize(numpy.array([value],dtype=dtype))
+    kind,data = summary
+
+    if kind == 'distinct':
+        return bool(numpy.isin(value,data).any())
+
+    positions = _bloom_positions(value,data.size*8)[0]
+    bytes_ = data[(positions >> numpy.uint64(3)).astype(numpy.intp)]
+    return bool(((bytes_ >> (positions & numpy.uint64(7)).astype(numpy.uint8)) & 1).all())
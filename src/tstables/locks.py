@@ -0,0 +1,17 @@
+import os
+import threading
+
+# One lock per HDF5 file (keyed by its absolute path), shared by every thread that accesses the file
+# through TsTables helpers.
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+def file_lock(h5_file):
+    """Returns the re-entrant lock that serializes access to an open HDF5 file
+    """
+
+    key = os.path.abspath(h5_file.filename)
+    with _file_locks_lock:
+        if key not in _file_locks:
+            _file_locks[key] = threading.RLock()
+        return _file_locks[key]
@@ -0,0 +1,174 @@
+import concurrent.futures
+import datetime
+import itertools
+
+import numpy
+
+from tstables import locks
+
+class PrefetchingReader:
+    """Reads a TsTable sequentially, reading and decoding the next partitions in the background
+
+    While the caller processes the rows of one partition, a background thread reads the next
+    `prefetch` partitions in the scan direction. `scan` is told the direction. For consecutive
+    `read_range` calls, the direction is `direction` if given ('forward' or 'backward'), or else
+    detected by comparing each range with the previous one.
+
+    HDF5 access holds the lock of the file (see `tstables.locks.file_lock`). Prefetched partitions
+    aren't refreshed, so partitions that are appended to during a scan may be read without their
+    newest rows.
+
+    Example::
+
+        with tstables.PrefetchingReader(ts,prefetch=3) as reader:
+            for day in days:
+                rows = reader.read_range(day,day + datetime.timedelta(days=1))
+                ...
+    """
+
+    def __init__(self,ts_table,prefetch=2,direction=None):
+        if direction not in (None,'forward','backward'):
+            raise ValueError("direction must be None, 'forward' or 'backward'")
+
+        self.ts_table = ts_table
+        self.prefetch = prefetch
+        self.direction = direction
+        self.lock = locks.file_lock(ts_table.file)
+
+        # Number of partitions served from a prefetch, and read on demand
+        self.hits = 0
+        self.misses = 0
+
+        self.__executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+            thread_name_prefix='tstables-prefetch')
+        # Futures of the rows of prefetched partitions, keyed by partition date
+        self.__pending = {}
+        self.__previous_dt = None
+        self.__detected_direction = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
+
+    def close(self):
+        for future in self.__pending.values():
+            future.cancel()
+        self.__pending = {}
+        self.__executor.shutdown()
+
+    def __read_partition(self,partition_dt):
+        with self.lock:
+            ts_data = self.ts_table._TsTable__fetch_partition_table(partition_dt)
+            if ts_data is None:
+                return numpy.ndarray(shape=0,dtype=self.ts_table._TsTable__v_dtype())
+            return self.ts_table._TsTable__read_table(ts_data)
+
+    def __partition_rows(self,partition_dt):
+        future = self.__pending.pop(partition_dt,None)
+        if future is not None:
+            self.hits += 1
+            return future.result()
+
+        self.misses += 1
+        return self.__read_partition(partition_dt)
+
+    def __prefetch(self,upcoming):
+        """Starts reading the partitions in `upcoming` that aren't being read, and forgets the
+        prefetched partitions that aren't in it
+        """
+
+        for partition_dt in list(self.__pending.keys()):
+            if partition_dt not in upcoming:
+                self.__pending.pop(partition_dt).cancel()
+
+        for partition_dt in upcoming:
+            if partition_dt not in self.__pending:
+                self.__pending[partition_dt] = self.__executor.submit(self.__read_partition,
+                                                                      partition_dt)
+
+    def __partitions_after(self,partition_dt,reverse):
+        one_day = datetime.timedelta(days=1)
+        with self.lock:
+            if reverse:
+                dates = self.ts_table._TsTable__iter_partition_dates(reverse=True,
+                                                                     last_dt=partition_dt - one_day)
+            else:
+                dates = self.ts_table._TsTable__iter_partition_dates(first_dt=partition_dt + one_day)
+            return list(itertools.islice(dates,self.prefetch))
+
+    def __range_partitions(self,start_dt,end_dt):
+        ts = self.ts_table
+        start_dt,end_dt = ts._TsTable__utc_range(start_dt,end_dt)
+        start_ts = ts._TsTable__dt_to_ts(start_dt)
+        end_ts = ts._TsTable__dt_to_ts(end_dt)
+
+        with self.lock:
+            dates = list(ts._TsTable__iter_partition_dates(
+                first_dt=ts._TsTable__ts_to_partition_date(start_ts),
+                last_dt=ts._TsTable__ts_to_partition_date(end_ts)))
+
+        return start_ts,end_ts,dates
+
+    @staticmethod
+    def __slice(rows,start_ts,end_ts):
+        return rows[numpy.searchsorted(rows['timestamp'],start_ts,side='left'):
+                    numpy.searchsorted(rows['timestamp'],end_ts,side='right')]
+
+    def read_range(self,start_dt,end_dt,as_pandas_dataframe=True):
+        """Returns the rows between start_dt and end_dt (inclusive), like `TsTable.read_range`, and
+        then starts prefetching the partitions that follow the range in the scan direction
+        """
+
+        start_ts,end_ts,dates = self.__range_partitions(start_dt,end_dt)
+
+        chunks = []
+        for partition_dt in dates:
+            rows = self.__slice(self.__partition_rows(partition_dt),start_ts,end_ts)
+            if rows.size > 0:
+                chunks.append(rows)
+
+        first_dt = self.ts_table._TsTable__ts_to_partition_date(start_ts)
+        last_dt = self.ts_table._TsTable__ts_to_partition_date(end_ts)
+
+        direction = self.direction
+        if direction is None:
+            if self.__previous_dt is not None and first_dt != self.__previous_dt:
+                self.__detected_direction = 'forward' if first_dt > self.__previous_dt else 'backward'
+            direction = self.__detected_direction
+        self.__previous_dt = first_dt
+
+        if direction == 'forward':
+            self.__prefetch(self.__partitions_after(last_dt,reverse=False))
+        elif direction == 'backward':
+            self.__prefetch(self.__partitions_after(first_dt,reverse=True))
+
+        return self.ts_table._TsTable__rows_from_chunks(chunks,as_pandas_dataframe)
+
+    def scan(self,start_dt,end_dt,as_pandas_dataframe=True,reverse=False):
+        """Yields the rows between start_dt and end_dt one partition at a time, in chronological order
+        (or reverse chronological order), while the next partitions are read in the background
+        """
+
+        start_ts,end_ts,dates = self.__range_partitions(start_dt,end_dt)
+        if reverse:
+            dates.reverse()
+
+        for idx,partition_dt in enumerate(dates):
+            upcoming = dates[idx+1:idx+1+self.prefetch]
+            if partition_dt in self.__pending:
+                # Keep the background thread busy while we wait for this partition
+                future = self.__pending.pop(partition_dt)
+                self.__prefetch(upcoming)
+                self.hits += 1
+                rows = future.result()
+            else:
+                rows = self.__partition_rows(partition_dt)
+                self.__prefetch(upcoming)
+
+            rows = self.__slice(rows,start_ts,end_ts)
+            if rows.size > 0:
+                if as_pandas_dataframe:
+                    rows = self.ts_table._TsTable__to_dataframe(rows)
+                yield rows
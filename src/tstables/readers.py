@@ -0,0 +1,84 @@
+import numpy
+
+def iter_chunks(path,dtype,format='csv',chunk_rows=100000,**kwargs):
+    """Reads a CSV or Parquet file in chunks and yields each chunk as a structured array of `dtype`
+
+    The first column of `dtype` must be the int64 `timestamp` column. Timestamps are converted to
+    milliseconds since the epoch, and the other columns are copied straight into the structured
+    array, so each chunk is converted to the table dtype without building a DataFrame of records.
+    """
+
+    if format == 'csv':
+        return _iter_csv_chunks(path,dtype,chunk_rows,**kwargs)
+    elif format == 'parquet':
+        return _iter_parquet_chunks(path,dtype,chunk_rows,**kwargs)
+    else:
+        raise ValueError("format must be 'csv' or 'parquet'")
+
+def _to_ms(values):
+    """Converts parsed timestamps (datetime64, or int64 milliseconds) to int64 milliseconds
+    """
+
+    values = numpy.asarray(values)
+    if values.dtype.kind in 'iu':
+        return values.astype(numpy.int64)
+    return values.astype('datetime64[ms]').view(numpy.int64)
+
+def _iter_csv_chunks(path,dtype,chunk_rows,timestamp_format=None,**read_csv_kwargs):
+    # By default, the file has no header and its columns are in the order of the table columns
+    read_csv_kwargs.setdefault('header',None)
+    read_csv_kwargs.setdefault('names',list(dtype.names))
+
+    # Parse numeric columns straight to their table type, so pandas doesn't infer object columns
+    read_csv_kwargs.setdefault('dtype',dict((name,dtype[name]) for name in dtype.names[1:]
+                                            if dtype[name].kind in 'biuf'))
+
+    ts_name = read_csv_kwargs['names'][0]
+
+    import pandas
+
+    for chunk in pandas.read_csv(path,chunksize=chunk_rows,**read_csv_kwargs):
+        timestamps = chunk[ts_name]
+        if timestamps.dtype.kind not in 'iu':
+            timestamps = pandas.to_datetime(timestamps,utc=True,format=timestamp_format)
+            timestamps = timestamps.dt.tz_localize(None)
+
+        rows = numpy.empty(shape=len(chunk),dtype=dtype)
+        rows['timestamp'] = _to_ms(timestamps)
+        for name in dtype.names[1:]:
+            rows[name] = chunk[name].to_numpy()
+
+        yield rows
+
+def _iter_parquet_chunks(path,dtype,chunk_rows,columns=None):
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('reading Parquet files requires pyarrow')
+
+    # The file's columns that map to the table columns, in table order
+    columns = columns or list(dtype.names)
+
+    parquet_file = pyarrow.parquet.ParquetFile(path)
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows,columns=columns):
+        rows = numpy.empty(shape=batch.num_rows,dtype=dtype)
+
+        timestamps = batch.column(0)
+        if pyarrow.types.is_timestamp(timestamps.type):
+            # Arrow timestamps are stored as UTC, so casting to int64 gives epoch milliseconds
+            timestamps = pyarrow.compute.cast(timestamps,pyarrow.timestamp('ms',tz=timestamps.type.tz),
+                                              safe=False).cast(pyarrow.int64())
+            rows['timestamp'] = timestamps.to_numpy()
+        elif pyarrow.types.is_integer(timestamps.type):
+            rows['timestamp'] = timestamps.to_numpy()
+        else:
+            import pandas
+            parsed = pandas.to_datetime(timestamps.to_pandas(),utc=True).dt.tz_localize(None)
+            rows['timestamp'] = _to_ms(parsed)
+
+        for idx,name in enumerate(dtype.names[1:]):
+            rows[name] = batch.column(idx+1).to_numpy(zero_copy_only=False)
+
+        yield rows
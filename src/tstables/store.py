@@ -0,0 +1,308 @@
+import concurrent.futures
+import datetime
+import json
+import multiprocessing
+import os
+
+import numpy
+import tables
+
+import tstables
+
+def _read_shard(shard_path,name,start_dt,end_dt):
+    """Reads a range from one shard file. Runs in a worker process, so it opens the file itself.
+    """
+
+    with tables.open_file(shard_path,'r') as h5_file:
+        ts = h5_file.get_node('/',name)._f_get_timeseries()
+        return ts.read_range(start_dt,end_dt,as_pandas_dataframe=False)
+
+class TsStore:
+    """A logical time series sharded across several HDF5 files, one file per year or per month
+
+    The shard files live in one directory, next to a small JSON manifest that records the schema of
+    the series and which file holds each shard. Each shard is an ordinary TsTables file with a time
+    series called `name` at the root, so it can also be opened on its own.
+
+    Shard files are opened lazily, the first time a read or append touches them. In read-only mode
+    (`mode='r'`), ranges that span several shards are read in parallel by worker processes.
+
+    Example::
+
+        store = tstables.TsStore.create('eurusd/','EURUSD',Price,shard_by='month')
+        store.append(rows)
+        store.close()
+
+        store = tstables.TsStore('eurusd/')
+        rows = store.read_range(start_dt,end_dt)
+    """
+
+    MANIFEST_NAME = 'manifest.json'
+
+    def __init__(self,path,mode='r',max_workers=None):
+        self.path = path
+        self.mode = mode
+        self.max_workers = max_workers
+
+        with open(os.path.join(path,TsStore.MANIFEST_NAME)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+
+        self.name = self.manifest['name']
+        self.shard_by = self.manifest['shard_by']
+
+        # Open shard files and time series, keyed by shard key
+        self.__files = {}
+        self.__series = {}
+        self.__executor = None
+        self.__converter_ts = None
+
+    @classmethod
+    def create(cls,path,name,description,shard_by='year',title='',filters=None,
+        expectedrows_per_partition=10000,chunkshape=None,byteorder=None,max_workers=None):
+        """Creates a new, empty store in the directory `path` and returns it opened in append mode
+        """
+
+        if shard_by not in ('year','month'):
+            raise AttributeError("shard_by must be 'year' or 'month'")
+
+        dtype = tables.description.dtype_from_descr(description)
+        if dtype.names[0] != 'timestamp' or dtype[0] != numpy.dtype('int64'):
+            raise AttributeError("first column must be called 'timestamp' and have type Int64")
+
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        manifest = {
+            'name': name,
+            'shard_by': shard_by,
+            'dtype': dtype.descr,
+            'title': title,
+            'filters': None if filters is None else {
+                'complevel': filters.complevel, 'complib': filters.complib,
+                'shuffle': filters.shuffle, 'bitshuffle': filters.bitshuffle,
+                'fletcher32': filters.fletcher32},
+            'expectedrows_per_partition': expectedrows_per_partition,
+            'chunkshape': chunkshape,
+            'byteorder': byteorder,
+            'shards': {}
+        }
+        cls.__write_manifest(path,manifest)
+
+        return cls(path,mode='a',max_workers=max_workers)
+
+    @staticmethod
+    def __write_manifest(path,manifest):
+        # Write to a temporary file first so that readers never see a partial manifest
+        manifest_path = os.path.join(path,TsStore.MANIFEST_NAME)
+        with open(manifest_path + '.tmp','w') as manifest_file:
+            json.dump(manifest,manifest_file,indent=2,sort_keys=True)
+        os.replace(manifest_path + '.tmp',manifest_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc_info):
+        self.close()
+
+    def close(self):
+        for h5_file in self.__files.values():
+            h5_file.close()
+        self.__files = {}
+        self.__series = {}
+
+        if self.__executor is not None:
+            self.__executor.shutdown()
+            self.__executor = None
+
+    def flush(self):
+        for h5_file in self.__files.values():
+            h5_file.flush()
+
+    def __dtype(self):
+        return numpy.dtype([tuple(tuple(f) if isinstance(f,list) else f for f in d)
+                            for d in self.manifest['dtype']])
+
+    def __converter(self):
+        """Returns a TsTable with the store's schema and no file, which converts rows to its dtype
+        """
+
+        if self.__converter_ts is None:
+            self.__converter_ts = tstables.TsTable(None,None,
+                tables.description.descr_from_dtype(self.__dtype())[0])
+        return self.__converter_ts
+
+    def __shard_key(self,dt):
+        if self.shard_by == 'year':
+            return dt.strftime('%Y')
+        else:
+            return dt.strftime('%Y-%m')
+
+    def __shard_bounds(self,key):
+        """Returns the first and last datetimes (inclusive, to the millisecond) of a shard
+        """
+
+        if self.shard_by == 'year':
+            start_dt = datetime.datetime(int(key),1,1,tzinfo=datetime.timezone.utc)
+            next_dt = datetime.datetime(int(key)+1,1,1,tzinfo=datetime.timezone.utc)
+        else:
+            year,month = int(key[:4]),int(key[5:])
+            start_dt = datetime.datetime(year,month,1,tzinfo=datetime.timezone.utc)
+            next_dt = datetime.datetime(year+month//12,month%12+1,1,tzinfo=datetime.timezone.utc)
+
+        return start_dt,next_dt - datetime.timedelta(milliseconds=1)
+
+    def __shard_path(self,key):
+        return os.path.join(self.path,self.manifest['shards'][key])
+
+    def __shard_ts(self,key,create=False):
+        """Returns the time series of a shard, opening (or creating) the shard file if needed.
+        Returns `None` if the shard doesn't exist and `create` is False.
+        """
+
+        if key in self.__series:
+            return self.__series[key]
+
+        if key not in self.manifest['shards']:
+            if not create:
+                return None
+            self.__create_shard(key)
+        else:
+            h5_file = tables.open_file(self.__shard_path(key),self.mode)
+            self.__files[key] = h5_file
+            self.__series[key] = h5_file.get_node('/',self.name)._f_get_timeseries()
+
+        return self.__series[key]
+
+    def __create_shard(self,key):
+        if self.mode == 'r':
+            raise IOError('cannot create a shard in a store opened read-only')
+
+        filters = None
+        if self.manifest['filters'] is not None:
+            filters = tables.Filters(**self.manifest['filters'])
+
+        chunkshape = self.manifest['chunkshape']
+        if chunkshape is not None:
+            chunkshape = tuple(chunkshape)
+
+        file_name = '%s_%s.h5' % (self.name,key)
+        h5_file = tables.open_file(os.path.join(self.path,file_name),'a')
+        try:
+            ts = h5_file.create_ts('/',self.name,description=self.__dtype(),
+                title=self.manifest['title'],filters=filters,
+                expectedrows_per_partition=self.manifest['expectedrows_per_partition'],
+                chunkshape=chunkshape,byteorder=self.manifest['byteorder'])
+        except:
+            h5_file.close()
+            raise
+
+        self.__files[key] = h5_file
+        self.__series[key] = ts
+
+        self.manifest['shards'][key] = file_name
+        self.__write_manifest(self.path,self.manifest)
+
+    def __sorted_shard_keys(self,reverse=False):
+        return sorted(self.manifest['shards'].keys(),reverse=reverse)
+
+    def __get_max_ts(self):
+        for key in self.__sorted_shard_keys(reverse=True):
+            max_ts = self.__shard_ts(key)._TsTable__get_max_ts()
+            if max_ts is not None:
+                return max_ts
+
+        return None
+
+    def __get_min_ts(self):
+        for key in self.__sorted_shard_keys():
+            min_ts = self.__shard_ts(key)._TsTable__get_min_ts()
+            if min_ts is not None:
+                return min_ts
+
+        return None
+
+    def min_dt(self):
+        return tstables.TsTable._TsTable__ts_to_dt(self.__get_min_ts())
+
+    def max_dt(self):
+        return tstables.TsTable._TsTable__ts_to_dt(self.__get_max_ts())
+
+    def append(self,rows,convert_strings=False):
+        """Appends rows to the store, splitting them across shards. Accepts the same rows as
+        `TsTable.append`.
+        """
+
+        # Convert all of the rows before appending to any shard, so that rows that can't be converted
+        # don't leave some shards appended to. Shards then get views of the converted rows, which
+        # already have their dtype.
+        rows = self.__converter()._TsTable__prepare_rows(rows,convert_strings)
+        if rows.size == 0:
+            return
+        timestamps = rows['timestamp']
+
+        # Rows are routed to shards by bisecting their timestamps, which requires them to be sorted
+        if not tstables.TsTable._TsTable__is_sorted(timestamps):
+            raise ValueError("timestamp column must be sorted in ascending order.")
+
+        # Every shard is appended to separately, so check the order across shards here
+        if timestamps[0] < (self.__get_max_ts() or numpy.iinfo('int64').min):
+            raise ValueError("rows start prior to the end of existing rows, so they cannot be "
+                             "appended.")
+
+        to_dt = tstables.TsTable._TsTable__ts_to_dt
+        key = self.__shard_key(to_dt(timestamps[0]))
+        last_key = self.__shard_key(to_dt(timestamps[-1]))
+
+        start_idx = 0
+        while True:
+            shard_end_ts = tstables.TsTable._TsTable__dt_to_ts(self.__shard_bounds(key)[1])
+            end_idx = numpy.searchsorted(timestamps,shard_end_ts,side='right')
+
+            if end_idx > start_idx:
+                self.__shard_ts(key,create=True).append(rows[start_idx:end_idx])
+
+            if key == last_key or end_idx == len(timestamps):
+                break
+
+            start_idx = end_idx
+            key = self.__shard_key(to_dt(timestamps[start_idx]))
+
+    def read_range(self,start_dt,end_dt,as_pandas_dataframe=True):
+        if start_dt.tzinfo is None:
+            start_dt = start_dt.replace(tzinfo=datetime.timezone.utc)
+        if end_dt.tzinfo is None:
+            end_dt = end_dt.replace(tzinfo=datetime.timezone.utc)
+
+        if start_dt > end_dt:
+            raise AttributeError('start_dt must be <= end_dt')
+
+        # Clip the range to each shard that exists, so each shard only looks at its own partitions
+        shard_ranges = []
+        for key in self.__sorted_shard_keys():
+            shard_start_dt,shard_end_dt = self.__shard_bounds(key)
+            if shard_end_dt >= start_dt and shard_start_dt <= end_dt:
+                shard_ranges.append((key,max(start_dt,shard_start_dt),min(end_dt,shard_end_dt)))
+
+        if self.mode == 'r' and len(shard_ranges) > 1:
+            # Open files can't be shared with other processes, so each worker opens its own shard.
+            # Workers are spawned rather than forked, because HDF5 isn't fork-safe and this process
+            # may have shard files open.
+            if self.__executor is None:
+                self.__executor = concurrent.futures.ProcessPoolExecutor(self.max_workers,
+                    mp_context=multiprocessing.get_context('spawn'))
+            futures = [self.__executor.submit(_read_shard,self.__shard_path(key),self.name,s_dt,e_dt)
+                       for key,s_dt,e_dt in shard_ranges]
+            chunks = [f.result() for f in futures]
+        else:
+            chunks = [self.__shard_ts(key).read_range(s_dt,e_dt,as_pandas_dataframe=False)
+                      for key,s_dt,e_dt in shard_ranges]
+
+        result = numpy.concatenate([numpy.ndarray(shape=0,dtype=self.__dtype())] + chunks)
+
+        if as_pandas_dataframe:
+            import pandas
+            result = pandas.DataFrame.from_records(result,
+                index=result['timestamp'].astype('datetime64[ms]'),
+                exclude=['timestamp'])
+
+        return result
@@ -1,5 +1,10 @@
 from tstables.tests import test_tstable_static
 from tstables.tests import test_tstable_file
+from tstables.tests import test_tstable_aio
+from tstables.tests import test_tstable_store
+from tstables.tests import test_tstable_bulk
+from tstables.tests import test_tstable_prefetch
+from tstables.tests import test_tstable_dask
 #from tstables import tstable
 
 def suite():
@@ -9,6 +14,11 @@ def suite():
     #suite.addTests(doctest.DocTestSuite(tstable))
     suite.addTests(test_tstable_static.suite())
     suite.addTests(test_tstable_file.suite())
+    suite.addTests(test_tstable_aio.suite())
+    suite.addTests(test_tstable_store.suite())
+    suite.addTests(test_tstable_bulk.suite())
+    suite.addTests(test_tstable_prefetch.suite())
+    suite.addTests(test_tstable_dask.suite())
     return suite
 
 if __name__ == '__main__':
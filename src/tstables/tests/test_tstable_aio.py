@@ -0,0 +1,81 @@
+import tables
+import tstables
+import unittest
+import datetime
+import pytz
+import tempfile
+import asyncio
+import os
+import numpy
+
+# Class to define record structure
+class Price(tables.IsDescription):
+    timestamp = tables.Int64Col(pos=0)
+    price = tables.Int32Col(pos=1)
+
+
+class AsyncTsTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_file = tempfile.mkstemp('h5')[1]
+        self.h5_file = tables.open_file(self.temp_file,'r+')
+
+        ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+        self.ats = tstables.AsyncTsTable(ts)
+
+        # One row every 6 hours from 2014-05-04T00:00:00Z to 2014-05-06T18:00:00Z
+        self.rows = numpy.array([(1399161600000+i*21600000,i) for i in range(12)],
+                                dtype=[('timestamp', '<i8'), ('price', '<i4')])
+
+    def tearDown(self):
+        self.h5_file.close()
+        os.remove(self.temp_file)
+
+    def test_append_and_read_range(self):
+        async def run():
+            await self.ats.append(self.rows)
+            return await self.ats.read_range(datetime.datetime(2014,5,4,tzinfo=pytz.utc),
+                                             datetime.datetime(2014,5,5,12,tzinfo=pytz.utc),
+                                             as_pandas_dataframe=False)
+
+        rows_read = asyncio.run(run())
+        self.assertEqual(list(rows_read['price']),[0,1,2,3,4,5,6])
+
+    def test_iter_range_streams_partitions(self):
+        async def run():
+            await self.ats.append(self.rows)
+            chunks = []
+            async for rows in self.ats.iter_range(datetime.datetime(2014,5,4,tzinfo=pytz.utc),
+                                                  datetime.datetime(2014,5,7,tzinfo=pytz.utc),
+                                                  as_pandas_dataframe=False):
+                chunks.append(list(rows['price']))
+            return chunks
+
+        self.assertEqual(asyncio.run(run()),[[0,1,2,3],[4,5,6,7],[8,9,10,11]])
+
+    def test_concurrent_reads(self):
+        async def run():
+            await self.ats.append(self.rows)
+            start_dt = datetime.datetime(2014,5,4,tzinfo=pytz.utc)
+            return await asyncio.gather(*[
+                self.ats.read_range(start_dt,start_dt+datetime.timedelta(days=d+1),as_pandas_dataframe=False)
+                for d in range(3)])
+
+        results = asyncio.run(run())
+        self.assertEqual([r.size for r in results],[5,9,12])
+
+    def test_read_range_invalid_range(self):
+        async def run():
+            await self.ats.read_range(datetime.datetime(2014,5,5),datetime.datetime(2014,5,4))
+
+        self.assertRaises(AttributeError,asyncio.run,run())
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(AsyncTsTableTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
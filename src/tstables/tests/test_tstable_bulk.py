@@ -0,0 +1,127 @@
+import tables
+import tstables
+import unittest
+import datetime
+import pytz
+import tempfile
+import os
+import numpy
+import mock
+
+# Class to define record structure
+class Price(tables.IsDescription):
+    timestamp = tables.Int64Col(pos=0)
+    price = tables.Int32Col(pos=1)
+
+
+class BulkLoadTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_file = tempfile.mkstemp('h5')[1]
+        self.h5_file = tables.open_file(self.temp_file,'r+')
+        self.ts = self.h5_file.create_ts('/','EURUSD',description=Price,
+                                         filters=tables.Filters(complevel=5,complib='blosc'))
+
+        # One row every hour for 5 days from 2014-05-01T00:00:00Z
+        self.rows = numpy.array([(1398902400000+i*3600000,i) for i in range(120)],
+                                dtype=[('timestamp', '<i8'), ('price', '<i4')])
+
+    def tearDown(self):
+        self.h5_file.close()
+        os.remove(self.temp_file)
+
+    def test_bulk_load(self):
+        tstables.bulk_load(self.ts,[self.rows[:50],self.rows[50:]],processes=2,rows_per_task=30)
+
+        rows_read = self.ts.read_range(datetime.datetime(2014,5,1,tzinfo=pytz.utc),
+                                       datetime.datetime(2014,5,6,tzinfo=pytz.utc),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),list(range(120)))
+
+        # Partitions are complete days, compressed with the filters of the series
+        tbl = self.ts.root_group.y2014.m05.d03.ts_data
+        self.assertEqual(tbl.nrows,24)
+        self.assertEqual(tbl.filters.complib,'blosc')
+
+    def test_bulk_load_copies_compressed_chunks(self):
+        # The first day already has rows, so its new rows are appended. The other partitions are
+        # copied from the worker files without being decoded.
+        self.ts.append(self.rows[:10])
+        append_rows = tstables.TsTable._TsTable__append_rows_to_partition
+        with mock.patch.object(tstables.TsTable,'_TsTable__append_rows_to_partition',autospec=True,
+                               side_effect=append_rows) as mock_append:
+            tstables.bulk_load(self.ts,self.rows[10:],processes=2,rows_per_task=30)
+            self.assertEqual(mock_append.call_count,1)
+
+        rows_read = self.ts.read_range(datetime.datetime(2014,5,1,tzinfo=pytz.utc),
+                                       datetime.datetime(2014,5,6,tzinfo=pytz.utc),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),list(range(120)))
+        self.assertEqual(self.ts.root_group.y2014.m05.d03.ts_data.filters.complib,'blosc')
+
+    def test_bulk_load_encoded_and_indexed(self):
+        ts = self.h5_file.create_ts('/','GBPUSD',description=Price,timestamp_encoding='offset32',
+                                    indexed_columns=['price'])
+        tstables.bulk_load(ts,self.rows,processes=2,rows_per_task=30)
+
+        tbl = ts.root_group.y2014.m05.d03.ts_data
+        self.assertEqual(tbl.coldtypes['timestamp'],numpy.dtype('int32'))
+        self.assertEqual(list(ts.root_group.y2014.m05.d03.ts_distinct_price.read()),list(range(48,72)))
+
+        rows_read = ts.read_range(datetime.datetime(2014,5,1,tzinfo=pytz.utc),
+                                  datetime.datetime(2014,5,6,tzinfo=pytz.utc),as_pandas_dataframe=False,
+                                  where={'price': 50})
+        self.assertEqual(list(rows_read['timestamp']),[1398902400000+50*3600000])
+
+    def test_bulk_load_rejects_rows_before_end(self):
+        self.ts.append(self.rows[60:])
+        self.assertRaises(ValueError,tstables.bulk_load,self.ts,self.rows[:60],processes=2)
+
+    def test_pipelined_append(self):
+        previous_threads = tables.set_blosc_max_threads(1)
+        try:
+            batches = (self.rows[i:i+25] for i in range(0,120,25))
+            tstables.pipelined_append(self.ts,batches,queue_size=1,blosc_threads=2)
+
+            # Blosc is set back to its previous number of threads
+            self.assertEqual(tables.set_blosc_max_threads(1),1)
+        finally:
+            tables.set_blosc_max_threads(previous_threads)
+
+        rows_read = self.ts.read_range(datetime.datetime(2014,5,1,tzinfo=pytz.utc),
+                                       datetime.datetime(2014,5,6,tzinfo=pytz.utc),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),list(range(120)))
+        self.assertEqual(self.ts.root_group.y2014.m05.d03.ts_data.nrows,24)
+
+    def test_pipelined_append_with_inherited_blosc_filters(self):
+        # The series has no filters of its own, so its partitions inherit Blosc from the file
+        temp_file = tempfile.mkstemp('h5')[1]
+        try:
+            with tables.open_file(temp_file,'w',filters=tables.Filters(complevel=5,complib='blosc')) as h5_file:
+                ts = h5_file.create_ts('/','EURUSD',description=Price)
+                self.assertIsNone(ts.table_filters)
+
+                set_threads = tables.set_blosc_max_threads
+                with mock.patch.object(tables,'set_blosc_max_threads',side_effect=set_threads) as mock_set:
+                    tstables.pipelined_append(ts,[self.rows[:60],self.rows[60:]])
+                    self.assertEqual(mock_set.call_args_list[0],mock.call(os.cpu_count()))
+
+                self.assertEqual(ts.root_group.y2014.m05.d03.ts_data.filters.complib,'blosc')
+        finally:
+            os.remove(temp_file)
+
+    def test_pipelined_append_raises_conversion_errors(self):
+        unsorted = self.rows[50:60][::-1]
+        self.assertRaises(ValueError,tstables.pipelined_append,self.ts,[self.rows[:50],unsorted,self.rows[60:]])
+
+        # Batches before the bad one are written
+        self.assertEqual(self.ts.max_dt(),datetime.datetime(2014,5,3,1,tzinfo=pytz.utc))
+        self.assertRaises(ValueError,tstables.pipelined_append,self.ts,self.rows[:10])
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(BulkLoadTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
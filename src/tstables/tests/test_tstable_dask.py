@@ -0,0 +1,74 @@
+import tables
+import tstables
+import unittest
+import datetime
+import pytz
+import tempfile
+import os
+import numpy
+
+try:
+    import dask.dataframe
+except ImportError:
+    dask = None
+
+# Class to define record structure
+class Price(tables.IsDescription):
+    timestamp = tables.Int64Col(pos=0)
+    price = tables.Int32Col(pos=1)
+    volume = tables.Float64Col(pos=2)
+
+
+@unittest.skipIf(dask is None,'dask[dataframe] is not installed')
+class ToDaskTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_file = tempfile.mkstemp('h5')[1]
+        self.h5_file = tables.open_file(self.temp_file,'r+')
+        self.ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+
+        # One row every 6 hours for 4 days from 2014-05-01T00:00:00Z
+        self.rows = numpy.array([(1398902400000+i*21600000,i,i*0.5) for i in range(16)],
+                                dtype=[('timestamp', '<i8'), ('price', '<i4'), ('volume', '<f8')])
+        self.ts.append(self.rows)
+
+    def tearDown(self):
+        self.h5_file.close()
+        os.remove(self.temp_file)
+
+    def test_one_partition_per_day(self):
+        start_dt = datetime.datetime(2014,5,1,12,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,4,6,tzinfo=pytz.utc)
+
+        df = self.ts.to_dask(start_dt,end_dt)
+        self.assertEqual(df.npartitions,4)
+        self.assertEqual(df.divisions[0],datetime.datetime(2014,5,1,12))
+        self.assertEqual(df.divisions[1],datetime.datetime(2014,5,2))
+
+        # The same rows as read_range
+        computed = df.compute(scheduler='threads')
+        expected = self.ts.read_range(start_dt,end_dt)
+        self.assertEqual(list(computed['price']),list(expected['price']))
+        self.assertEqual(list(computed.index),list(expected.index))
+
+    def test_columns(self):
+        df = self.ts.to_dask(datetime.datetime(2014,5,1,tzinfo=pytz.utc),
+                             datetime.datetime(2014,5,5,tzinfo=pytz.utc),columns=['volume'])
+        self.assertEqual(list(df.columns),['volume'])
+        self.assertEqual(df['volume'].sum().compute(scheduler='threads'),sum(range(16))*0.5)
+
+    def test_empty_range(self):
+        df = self.ts.to_dask(datetime.datetime(2015,1,1,tzinfo=pytz.utc),
+                             datetime.datetime(2015,1,2,tzinfo=pytz.utc))
+        self.assertEqual(len(df.compute(scheduler='threads')),0)
+        self.assertEqual(list(df.columns),['price','volume'])
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(ToDaskTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -147,38 +147,24 @@ class TsTableFileTestCase(unittest.TestCase):
             self.assertEqual(p,rows['price'][idx])
 
 
-    @mock.patch.object(tstables.TsTable, 'MAX_FULL_PARTITION_READ_SIZE', 1)
-    @mock.patch.object(tables.Table, 'read_where')
-    @mock.patch.object(tables.Table, 'read')
-    def test_read_using_read_where(self, mock_read, mock_read_where):
-
-        csv = u"""2014-05-05T01:01:01.100Z,1
-                 2014-05-05T01:01:01.100Z,2
-                 2014-05-05T01:01:01.100Z,3
-                 2014-05-05T01:01:01.100Z,4
-                 2014-05-05T01:01:01.100Z,5"""
-
-        sfile = StringIO(csv)
-
-        # Note: don't need the 'timestamp' column in the dtype param here because it will become the DatetimeIndex.
-        rows = pandas.read_csv(sfile,parse_dates=[0],index_col=0,names=['timestamp', 'price'],dtype={'price': 'i4'})
-
-        ts = self.h5_file.create_ts('/','EURUSD',description=Price)
-        ts.append(rows)
-
-        # Inspect to ensure that data has been stored correctly
-        tbl = ts.root_group.y2014.m05.d05.ts_data
+    @mock.patch.object(tstables.TsTable, 'MAX_FULL_PARTITION_READ_SIZE', 24)
+    def test_read_large_partition_in_chunks(self):
+        # 2014-05-05T01:01:01.100Z and the following 4 milliseconds. Rows are 12 bytes each.
+        ts,rows = self.__load_array_data([1399251661100+i for i in range(5)],[1,2,3,4,5])
 
-        self.assertEqual(tbl.nrows,5)
+        # The partition is larger than MAX_FULL_PARTITION_READ_SIZE, so the rows in the range are found by
+        # bisecting the timestamp column, and then read in spans of at most two rows
+        with mock.patch.object(tables.Table, 'read_where') as mock_read_where, \
+             mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            with self.assertWarns(ResourceWarning):
+                rows_read = ts.read_range(datetime.datetime(2014,5,5,tzinfo=pytz.utc),
+                                          datetime.datetime(2014,5,6,tzinfo=pytz.utc),as_pandas_dataframe=False)
 
-        # Table.read_where is a mock, so we need to give it a return value
-        mock_read_where.return_value = numpy.ndarray(shape=0,dtype=[('timestamp', '<i8'), ('price', '<i4')])
-
-        # Fetch rows over a larger range
-        rows_read = ts.read_range(datetime.datetime(2014,5,5,tzinfo=pytz.utc),datetime.datetime(2014,5,6,tzinfo=pytz.utc))
+            self.assertEqual(mock_read_where.called, False)
+            spans = [call[0][1:3] for call in mock_read.call_args_list if 'field' not in call[1]]
+            self.assertEqual(spans,[(0,2),(2,4),(4,5)])
 
-        self.assertEquals(mock_read_where.called, True)
-        self.assertEquals(mock_read.called, False)
+        self.assertEqual(list(rows_read['price']),[1,2,3,4,5])
 
     @mock.patch.object(tables.Table, 'read_where')
     @mock.patch.object(tables.Table, 'read')
@@ -333,6 +319,616 @@ class TsTableFileTestCase(unittest.TestCase):
         self.assertRaises(tables.NoSuchNodeError,self.h5_file.root._f_get_child,'EURUSD')
 
 
+    def __load_array_data(self,timestamps,prices):
+        rows = numpy.array(list(zip(timestamps,prices)),dtype=[('timestamp', '<i8'), ('price', '<i4')])
+
+        ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+        ts.append(rows)
+
+        return ts,rows
+
+    def test_read_asof(self):
+        # 2014-05-04T23:59:59.998Z, 2014-05-05T00:00:00.001Z, 2014-05-05T12:00:00.000Z, 2014-05-07T00:00:00.000Z
+        ts,rows = self.__load_array_data([1399247999998,1399248000001,1399291200000,1399420800000],
+                                         [1,2,3,4])
+
+        query = [datetime.datetime(2014,5,5,12,tzinfo=pytz.utc),       # exact match -> 3
+                 datetime.datetime(2014,5,5,tzinfo=pytz.utc),          # previous partition -> 1
+                 datetime.datetime(2014,5,6,23,tzinfo=pytz.utc),       # empty partition -> 3
+                 datetime.datetime(2014,5,8,tzinfo=pytz.utc),          # after the end -> 4
+                 datetime.datetime(2014,5,5,0,0,0,1000,tzinfo=pytz.utc)] # -> 2
+
+        result = ts.read_asof(query,as_pandas_dataframe=False)
+
+        self.assertEqual(list(result['price']),[3,1,3,4,2])
+        self.assertEqual(list(result['timestamp']),
+                         [1399291200000,1399247999998,1399291200000,1399420800000,1399248000001])
+
+    def test_read_asof_before_first_row(self):
+        ts,rows = self.__load_array_data([1399248000001,1399291200000],[1,2])
+
+        query = numpy.array(['2014-05-05T00:00:00.000','2014-05-01T00:00:00.000','2014-05-05T12:00:00.000'],
+                            dtype='datetime64[ms]')
+        result = ts.read_asof(query,as_pandas_dataframe=False)
+
+        self.assertEqual(list(result['price']),[0,0,2])
+        self.assertEqual(result['timestamp'][0],numpy.iinfo('int64').min)
+        self.assertEqual(result['timestamp'][1],numpy.iinfo('int64').min)
+
+        df = ts.read_asof(query)
+        self.assertTrue(numpy.isnan(df['price'].iloc[0]))
+        self.assertEqual(df['price'].iloc[2],2)
+
+    def test_read_last_and_first(self):
+        # Note that May 5 is missing, so its partition is empty
+        ts,rows = self.__load_array_data([1399247999998,1399247999999,1399334400000,1399334400001,1399334400002],
+                                         [1,2,3,4,5])
+
+        self.assertEqual(list(ts.read_last(2,as_pandas_dataframe=False)['price']),[4,5])
+        self.assertEqual(list(ts.read_last(4,as_pandas_dataframe=False)['price']),[2,3,4,5])
+        self.assertEqual(list(ts.read_last(10,as_pandas_dataframe=False)['price']),[1,2,3,4,5])
+        self.assertEqual(list(ts.read_first(1,as_pandas_dataframe=False)['price']),[1])
+        self.assertEqual(list(ts.read_first(3,as_pandas_dataframe=False)['price']),[1,2,3])
+        self.assertEqual(ts.read_first(0,as_pandas_dataframe=False).size,0)
+
+        self.assertEqual(list(ts.read_last(2)['price']),[4,5])
+
+        self.assertEqual(ts.min_dt(),datetime.datetime(2014,5,4,23,59,59,998*1000,tzinfo=pytz.utc))
+        self.assertEqual(ts.max_dt(),datetime.datetime(2014,5,6,0,0,0,2*1000,tzinfo=pytz.utc))
+
+    def test_read_range_with_partition_cache(self):
+        ts,rows = self.__load_array_data([1399247999998,1399248000001,1399291200000],[1,2,3])
+        ts.cache = tstables.PartitionCache()
+
+        start_dt = datetime.datetime(2014,5,5,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,5,6,tzinfo=pytz.utc)
+
+        self.assertEqual(list(ts.read_range(start_dt,end_dt,as_pandas_dataframe=False)['price']),[2])
+        self.assertEqual(ts.cache.misses,1)
+
+        # The second read of the same partition is served from the cache
+        with mock.patch.object(tables.Table, 'read') as mock_read:
+            rows_read = ts.read_range(start_dt,end_dt+datetime.timedelta(hours=12),as_pandas_dataframe=False)
+            self.assertEqual(mock_read.called, False)
+        self.assertEqual(list(rows_read['price']),[2,3])
+        self.assertEqual(ts.cache.hits,1)
+
+        # Appending to the partition invalidates only that partition
+        ts.read_range(datetime.datetime(2014,5,4,tzinfo=pytz.utc),end_dt,as_pandas_dataframe=False)
+        self.assertEqual(len(ts.cache),2)
+        ts.append(numpy.array([(1399291200001,4)],dtype=[('timestamp', '<i8'), ('price', '<i4')]))
+        self.assertEqual(len(ts.cache),1)
+
+        rows_read = ts.read_range(start_dt,end_dt+datetime.timedelta(hours=12),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),[2,3,4])
+
+    def test_partition_cache_evicts_least_recently_used(self):
+        cache = tstables.PartitionCache(max_bytes=200)
+        cache.put('a',numpy.zeros(10))
+        cache.put('b',numpy.zeros(10))
+        cache.get('a')
+        cache.put('c',numpy.zeros(10))
+
+        self.assertEqual(cache.nbytes,160)
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+
+        # Arrays bigger than the whole budget are never cached
+        cache.put('d',numpy.zeros(100))
+        self.assertIsNone(cache.get('d'))
+
+    def test_ingest_csv(self):
+        csv_file = tempfile.mkstemp('.csv')[1]
+        with open(csv_file,'w') as f:
+            f.write(u"2014-05-04T23:59:59.998Z,1\n"
+                    u"2014-05-04T23:59:59.999Z,2\n"
+                    u"2014-05-05T00:00:00.000Z,3\n"
+                    u"2014-05-05T00:00:00.001Z,4\n"
+                    u"2014-05-06T12:00:00.000Z,5\n")
+
+        try:
+            ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+            ts.ingest(csv_file,chunk_rows=2)
+        finally:
+            os.remove(csv_file)
+
+        self.assertEqual(ts.root_group.y2014.m05.d04.ts_data.nrows,2)
+        self.assertEqual(ts.root_group.y2014.m05.d05.ts_data.nrows,2)
+
+        rows_read = ts.read_range(datetime.datetime(2014,5,4,tzinfo=pytz.utc),
+                                  datetime.datetime(2014,5,7,tzinfo=pytz.utc),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),[1,2,3,4,5])
+        self.assertEqual(rows_read['timestamp'][2],1399248000000)
+
+    def test_ingest_parquet(self):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise unittest.SkipTest('pyarrow is not installed')
+
+        table = pyarrow.table({
+            'timestamp': pyarrow.array([1399247999998,1399248000001,1399291200000],
+                                       type=pyarrow.timestamp('ms',tz='UTC')),
+            'price': pyarrow.array([1,2,3],type=pyarrow.int64())})
+
+        parquet_file = tempfile.mkstemp('.parquet')[1]
+        try:
+            pyarrow.parquet.write_table(table,parquet_file)
+            ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+            ts.ingest(parquet_file,format='parquet',chunk_rows=2)
+        finally:
+            os.remove(parquet_file)
+
+        rows_read = ts.read_range(datetime.datetime(2014,5,4,tzinfo=pytz.utc),
+                                  datetime.datetime(2014,5,7,tzinfo=pytz.utc),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),[1,2,3])
+        self.assertEqual(list(rows_read['timestamp']),[1399247999998,1399248000001,1399291200000])
+
+    def test_read_range_as_arrow(self):
+        try:
+            import pyarrow
+        except ImportError:
+            raise unittest.SkipTest('pyarrow is not installed')
+
+        ts,rows = self.__load_array_data([1399247999998,1399248000001,1399291200000,1399420800000],
+                                         [1,2,3,4])
+
+        start_dt = datetime.datetime(2014,5,4,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,6,tzinfo=pytz.utc)
+        table = ts.read_range(start_dt,end_dt,output='arrow')
+
+        self.assertEqual(table.num_rows,3)
+        self.assertEqual(table.schema.field('timestamp').type,pyarrow.timestamp('ms',tz='UTC'))
+        self.assertEqual(table.column('price').to_pylist(),[1,2,3])
+        self.assertEqual(table.column('timestamp')[1].as_py(),
+                         datetime.datetime(2014,5,5,0,0,0,1000,tzinfo=pytz.utc))
+
+        batches = list(ts.iter_range(start_dt,end_dt,output='arrow'))
+        self.assertEqual([b.num_rows for b in batches],[1,2])
+
+        # An empty range still has the schema
+        empty = ts.read_range(end_dt,end_dt,output='arrow')
+        self.assertEqual(empty.num_rows,0)
+        self.assertEqual(empty.schema,table.schema)
+
+        self.assertRaises(ValueError,ts.read_range,start_dt,end_dt,output='csv')
+
+    def test_delete_range(self):
+        # 2014-05-04T12:00Z, 2014-05-05T00:00Z, 2014-05-05T12:00Z, 2014-05-06T12:00Z, 2014-06-01T12:00Z
+        ts,rows = self.__load_array_data([1399204800000,1399248000000,1399291200000,1399377600000,1401624000000],
+                                         [1,2,3,4,5])
+
+        deleted = ts.delete_range(datetime.datetime(2014,5,4,18,tzinfo=pytz.utc),
+                                  datetime.datetime(2014,5,31,tzinfo=pytz.utc))
+        self.assertEqual(deleted,3)
+
+        # The edge partition keeps its other rows, and covered partitions are gone
+        self.assertEqual(ts.root_group.y2014.m05.d04.ts_data.nrows,1)
+        self.assertRaises(tables.NoSuchNodeError,ts.root_group.y2014.m05._f_get_child,'d05')
+        self.assertRaises(tables.NoSuchNodeError,ts.root_group.y2014.m05._f_get_child,'d30')
+
+        rows_read = ts.read_range(datetime.datetime(2014,5,1,tzinfo=pytz.utc),
+                                  datetime.datetime(2014,6,2,tzinfo=pytz.utc),as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),[1,5])
+
+        # Removing the rest of May also removes the month group
+        ts.delete_range(datetime.datetime(2014,5,1,tzinfo=pytz.utc),datetime.datetime(2014,5,31,23,59,59,999000,tzinfo=pytz.utc))
+        self.assertRaises(tables.NoSuchNodeError,ts.root_group.y2014._f_get_child,'m05')
+        self.assertEqual(ts.min_dt(),datetime.datetime(2014,6,1,12,tzinfo=pytz.utc))
+
+    def test_apply_retention(self):
+        ts,rows = self.__load_array_data([1399204800000,1399248000000,1399291200000,1399377600000],[1,2,3,4])
+
+        deleted = ts.apply_retention(datetime.timedelta(days=2),now=datetime.datetime(2014,5,7,tzinfo=pytz.utc))
+        self.assertEqual(deleted,1)
+        self.assertEqual(ts.min_dt(),datetime.datetime(2014,5,5,tzinfo=pytz.utc))
+
+        # Deleting everything keeps the time series usable
+        ts.delete_range(datetime.datetime(1970,1,1,tzinfo=pytz.utc),datetime.datetime(2100,1,1,tzinfo=pytz.utc))
+        ts.append(rows[3:])
+        self.assertEqual(list(ts.read_last(5,as_pandas_dataframe=False)['price']),[4])
+
+    def test_count_range(self):
+        # 2014-05-04T12:00Z, 2014-05-05T00:00Z, 2014-05-05T12:00Z, 2014-05-06T12:00Z, 2014-06-01T12:00Z
+        ts,rows = self.__load_array_data([1399204800000,1399248000000,1399291200000,1399377600000,1401624000000],
+                                         [1,2,3,4,5])
+
+        self.assertEqual(ts.count_range(datetime.datetime(2014,1,1),datetime.datetime(2015,1,1)),5)
+        self.assertEqual(ts.count_range(datetime.datetime(2014,5,4,12),datetime.datetime(2014,5,5)),2)
+        self.assertEqual(ts.count_range(datetime.datetime(2014,5,4,13),datetime.datetime(2014,6,1,12)),4)
+        self.assertEqual(ts.count_range(datetime.datetime(2014,5,7),datetime.datetime(2014,5,31)),0)
+
+        # Only the edge partitions are read, and only their timestamp column
+        with mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            self.assertEqual(ts.count_range(datetime.datetime(2014,5,4,13),datetime.datetime(2014,6,1,12)),4)
+            self.assertEqual(mock_read.call_count,2)
+            for call in mock_read.call_args_list:
+                self.assertEqual(call[1]['field'],'timestamp')
+
+    def test_read_aggregate(self):
+        # One row every 20 minutes for 3 days from 2014-05-04T00:00:00Z
+        timestamps = [1399161600000+i*1200000 for i in range(216)]
+        prices = [(i*7) % 50 for i in range(216)]
+        ts,rows = self.__load_array_data(timestamps,prices)
+
+        start_dt = datetime.datetime(2014,5,4,0,30,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,6,12,tzinfo=pytz.utc)
+        expected = ts.read_range(start_dt,end_dt)['price']
+
+        # Buckets of two days span partitions, so they have to be merged across them
+        for freq in [datetime.timedelta(hours=1),datetime.timedelta(days=2),3600000*5]:
+            result = ts.read_aggregate(start_dt,end_dt,freq,
+                                       {'price': ['first','max','min','last','sum','count','mean']})
+
+            resampled = expected.resample(pandas.Timedelta(milliseconds=freq) if isinstance(freq,int) else freq,
+                                          origin='epoch')
+            resampled = resampled.agg(['first','max','min','last','sum','count','mean']).dropna()
+
+            self.assertEqual(list(result.index),list(resampled.index))
+            for agg in ['first','max','min','last','sum','count','mean']:
+                self.assertEqual(list(result['price_' + agg]),list(resampled[agg]))
+
+        # A single aggregation keeps the column name
+        result = ts.read_aggregate(start_dt,end_dt,datetime.timedelta(days=1),{'price': 'max'},
+                                   as_pandas_dataframe=False)
+        self.assertEqual(result.dtype.names,('timestamp','price'))
+        self.assertEqual(list(result['timestamp']),[1399161600000,1399248000000,1399334400000])
+
+        self.assertRaises(ValueError,ts.read_aggregate,start_dt,end_dt,60000,{'price': 'median'})
+
+    def test_coverage(self):
+        # One row every 20 minutes on 2014-05-04 and from 2014-05-06T06:00Z to 2014-05-06T23:40Z
+        timestamps = [1399161600000+i*1200000 for i in range(72)] + \
+                     [1399356000000+i*1200000 for i in range(54)]
+        ts,rows = self.__load_array_data(timestamps,list(range(126)))
+
+        start_dt = datetime.datetime(2014,5,4,0,30,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,6,12,tzinfo=pytz.utc)
+
+        # The same counts as resampling the rows, including the empty buckets
+        result = ts.coverage(start_dt,end_dt,datetime.timedelta(hours=1))
+        expected = ts.read_range(start_dt,end_dt)['price'].resample('1h').count()
+        self.assertEqual(list(result.index),list(expected.index))
+        self.assertEqual(list(result['count']),list(expected))
+
+        # Partitions that lie in one bucket are counted without reading them
+        with mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            result = ts.coverage(datetime.datetime(2014,5,4,tzinfo=pytz.utc),
+                                 datetime.datetime(2014,5,7,tzinfo=pytz.utc),86400000,
+                                 as_pandas_dataframe=False)
+            self.assertEqual(mock_read.call_count,0)
+        self.assertEqual(list(result['timestamp']),[1399161600000,1399248000000,1399334400000,1399420800000])
+        self.assertEqual(list(result['count']),[72,0,54,0])
+
+        self.assertEqual(ts.coverage(start_dt,end_dt,datetime.timedelta(hours=1),gaps=True),
+                         [(datetime.datetime(2014,5,5,tzinfo=pytz.utc),
+                           datetime.datetime(2014,5,6,5,59,59,999000,tzinfo=pytz.utc))])
+        row_dt = datetime.datetime(2014,5,4,0,40,tzinfo=pytz.utc)
+        self.assertEqual(ts.coverage(row_dt,row_dt,60000,gaps=True),[])
+
+        self.assertRaises(ValueError,ts.coverage,start_dt,end_dt,0)
+
+    def test_read_since(self):
+        # 2014-05-04T12:00Z, 2014-05-05T00:00Z, 2014-05-05T12:00Z, 2014-06-01T12:00Z
+        ts,rows = self.__load_array_data([1399204800000,1399248000000,1399291200000,1401624000000],
+                                         [1,2,3,4])
+
+        self.assertEqual(list(ts.read_since(None,as_pandas_dataframe=False)['price']),[1,2,3,4])
+        self.assertEqual(list(ts.read_since(1399248000000,as_pandas_dataframe=False)['price']),[3,4])
+        self.assertEqual(list(ts.read_since(datetime.datetime(2014,5,20),as_pandas_dataframe=False)['price']),[4])
+        self.assertEqual(ts.read_since(1401624000000,as_pandas_dataframe=False).size,0)
+
+        df = ts.read_since(datetime.datetime(2014,5,5,tzinfo=pytz.utc))
+        self.assertEqual(list(df['price']),[3,4])
+
+    def test_append_skip_duplicates(self):
+        # 2014-05-04T12:00Z, 2014-05-05T00:00Z, 2014-05-05T12:00Z
+        ts,rows = self.__load_array_data([1399204800000,1399248000000,1399291200000],[1,2,3])
+
+        # A replay of the last two rows, with two new rows (one with the same timestamp as the last)
+        replay = numpy.array([(1399248000000,2),(1399291200000,3),(1399291200000,4),(1401624000000,5)],
+                             dtype=rows.dtype)
+        self.assertRaises(ValueError,ts.append,replay)
+        ts.append(replay,on_overlap='skip_duplicates')
+        ts.append(replay,on_overlap='skip_duplicates')
+
+        self.assertEqual(list(ts.read_since(None,as_pandas_dataframe=False)['price']),[1,2,3,4,5])
+
+        # Rows before the end that aren't duplicates still can't be appended
+        changed = numpy.array([(1399248000000,7),(1401710400000,8)],dtype=rows.dtype)
+        self.assertRaises(ValueError,ts.append,changed,on_overlap='skip_duplicates')
+        self.assertEqual(ts.count_range(datetime.datetime(2014,1,1),datetime.datetime(2015,1,1)),5)
+
+        self.assertRaises(ValueError,ts.append,replay,on_overlap='ignore')
+
+    def test_append_structured_array_without_copies(self):
+        ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+
+        # 2014-05-04T12:00Z, 2014-05-05T00:00Z, 2014-05-05T12:00Z
+        rows = numpy.array([(1399204800000,1),(1399248000000,2),(1399291200000,3)],
+                           dtype=ts._TsTable__v_dtype())
+
+        with mock.patch.object(tables.Table, 'append', autospec=True, side_effect=tables.Table.append) as mock_append:
+            ts.append(rows)
+            self.assertEqual(mock_append.call_count,2)
+            for call in mock_append.call_args_list:
+                self.assertTrue(numpy.shares_memory(call[0][1],rows))
+
+        self.assertEqual(list(ts.read_since(None,as_pandas_dataframe=False)['price']),[1,2,3])
+
+    def test_append_column_dict(self):
+        ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+
+        ts.append({'timestamp': numpy.array(['2014-05-04T12:00','2014-05-05T00:00'],dtype='datetime64[ms]'),
+                   'price': [1,2]})
+        ts.append({'timestamp': numpy.array([1399291200000]), 'price': numpy.array([3])})
+
+        rows = ts.read_since(None,as_pandas_dataframe=False)
+        self.assertEqual(list(rows['timestamp']),[1399204800000,1399248000000,1399291200000])
+        self.assertEqual(list(rows['price']),[1,2,3])
+
+        self.assertRaises(ValueError,ts.append,{'timestamp': [1399377600000]})
+        self.assertRaises(ValueError,ts.append,{'timestamp': [1399377600000,1399377600000], 'price': [1]})
+        self.assertRaises(ValueError,ts.append,{'timestamp': [1399377600001,1399377600000], 'price': [1,2]})
+
+    def test_session_aligned_partitions(self):
+        # Partitions run from 17:00 to 17:00 New York time, which is 22:00Z in winter and 21:00Z in summer
+        ts = self.h5_file.create_ts('/','EURUSD',description=Price,partition_tz='America/New_York',
+                                    partition_offset=datetime.timedelta(hours=-7))
+
+        timestamps = numpy.array(['2014-01-05T21:30','2014-01-05T22:00','2014-05-04T20:59:59.999',
+                                  '2014-05-04T21:00','2014-05-05T12:00','2014-05-05T21:00'],
+                                 dtype='datetime64[ms]')
+        ts.append({'timestamp': timestamps, 'price': [1,2,3,4,5,6]})
+
+        self.assertEqual(ts.root_group.y2014.m01.d05.ts_data.nrows,1)
+        self.assertEqual(ts.root_group.y2014.m01.d06.ts_data.nrows,1)
+        self.assertEqual(ts.root_group.y2014.m05.d04.ts_data.nrows,1)
+        self.assertEqual(ts.root_group.y2014.m05.d05.ts_data.nrows,2)
+        self.assertEqual(ts.root_group.y2014.m05.d06.ts_data.nrows,1)
+
+        # The settings are stored with the time series, and a session read touches one partition
+        ts = self.h5_file.root.EURUSD._f_get_timeseries()
+        self.assertEqual(ts.partition_tz,'America/New_York')
+        self.assertEqual(ts.partition_offset,datetime.timedelta(hours=-7))
+
+        with mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            rows = ts.read_range(datetime.datetime(2014,5,4,21,tzinfo=pytz.utc),
+                                 datetime.datetime(2014,5,5,20,59,59,999000,tzinfo=pytz.utc),
+                                 as_pandas_dataframe=False)
+            self.assertEqual(mock_read.call_count,1)
+        self.assertEqual(list(rows['price']),[4,5])
+
+        self.assertEqual(ts.count_range(datetime.datetime(2014,1,1),datetime.datetime(2015,1,1)),6)
+
+        self.assertRaises(AttributeError,self.h5_file.create_ts,'/','A',description=Price,
+                          partition_tz='Not/A_Zone')
+        self.assertRaises(AttributeError,self.h5_file.create_ts,'/','B',description=Price,
+                          partition_offset=datetime.timedelta(days=1))
+
+    def test_offset32_timestamp_encoding(self):
+        ts = self.h5_file.create_ts('/','EURUSD',description=Price,timestamp_encoding='offset32')
+
+        # 2014-05-04T12:00Z, 2014-05-04T23:59:59.999Z, 2014-05-05T00:00Z, 2014-05-05T12:00Z
+        timestamps = [1399204800000,1399247999999,1399248000000,1399291200000]
+        ts.append({'timestamp': timestamps, 'price': [1,2,3,4]})
+
+        ts_data = ts.root_group.y2014.m05.d04.ts_data
+        self.assertEqual(ts_data.coldtypes['timestamp'],numpy.dtype('int32'))
+        self.assertEqual(ts_data.attrs._TS_TABLES_TIMESTAMP_BASE,1399161600000)
+        self.assertEqual(list(ts_data.col('timestamp')),[43200000,86399999])
+
+        # Reads decode the timestamps, including through a reopened time series
+        ts = self.h5_file.root.EURUSD._f_get_timeseries()
+        self.assertEqual(ts.timestamp_encoding,'offset32')
+
+        start_dt = datetime.datetime(2014,5,4,23,59,59,999000,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,5,12,tzinfo=pytz.utc)
+        rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False)
+        self.assertEqual(rows.dtype['timestamp'],numpy.dtype('int64'))
+        self.assertEqual(list(rows['timestamp']),timestamps[1:])
+
+        with mock.patch.object(tstables.TsTable,'MAX_FULL_PARTITION_READ_SIZE',0):
+            with self.assertWarns(ResourceWarning):
+                rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False)
+            self.assertEqual(list(rows['timestamp']),timestamps[1:])
+
+        self.assertEqual(list(ts.read_last(3,as_pandas_dataframe=False)['timestamp']),timestamps[1:])
+        self.assertEqual(list(ts.read_asof([1399248000001],as_pandas_dataframe=False)['price']),[3])
+        self.assertEqual(ts.max_dt(),end_dt)
+        self.assertEqual(ts.count_range(start_dt,end_dt),3)
+
+        self.assertEqual(ts.delete_range(start_dt,start_dt),1)
+        ts.append({'timestamp': [1399291200001], 'price': [5]})
+        self.assertEqual(list(ts.read_since(None,as_pandas_dataframe=False)['price']),[1,3,4,5])
+
+        self.assertRaises(AttributeError,self.h5_file.create_ts,'/','A',description=Price,
+                          timestamp_encoding='delta')
+
+    def test_get_timeseries_without_opening_partitions(self):
+        self.h5_file.create_ts('/','EURUSD',description=Price,title='EUR/USD',
+                               filters=tables.Filters(complevel=5,complib='blosc'),
+                               expectedrows_per_partition=500,chunkshape=(64,))
+
+        # The settings come from the attributes of the time series group
+        with mock.patch.object(tstables.TsTable,'_TsTable__fetch_first_table',side_effect=AssertionError):
+            ts = self.h5_file.root.EURUSD._f_get_timeseries()
+        self.assertEqual(ts.table_title,'EUR/USD')
+        self.assertEqual(ts.table_filters.complib,'blosc')
+        self.assertEqual(ts.table_expectedrows,500)
+        self.assertEqual(ts.table_chunkshape,(64,))
+
+        # New partitions get the same settings
+        ts.append({'timestamp': [1399204800000], 'price': [1]})
+        ts_data = ts.root_group.y2014.m05.d04.ts_data
+        self.assertEqual(ts_data.dtype,numpy.dtype([('timestamp','<i8'),('price','<i4')]))
+        self.assertEqual(ts_data.filters.complib,'blosc')
+        self.assertEqual(ts_data.chunkshape,(64,))
+        self.assertEqual(ts_data.attrs._TS_TABLES_EXPECTEDROWS_PER_PARTITION,500)
+
+        # Time series created without the attributes are opened from their first partition
+        del self.h5_file.root.EURUSD._v_attrs._TS_TABLES_DTYPE
+        ts = self.h5_file.root.EURUSD._f_get_timeseries()
+        self.assertEqual(ts.table_expectedrows,500)
+        self.assertEqual(ts.table_chunkshape,(64,))
+        self.assertEqual(list(ts.read_last(1,as_pandas_dataframe=False)['price']),[1])
+
+    def test_read_range_where_with_index(self):
+        class Trade(tables.IsDescription):
+            timestamp = tables.Int64Col(pos=0)
+            venue = tables.StringCol(4,pos=1)
+            order_id = tables.Int64Col(pos=2)
+
+        self.h5_file.create_ts('/','EURUSD',description=Trade,indexed_columns=['venue','order_id'])
+        ts = self.h5_file.root.EURUSD._f_get_timeseries()
+        self.assertEqual(ts.indexed_columns,['venue','order_id'])
+
+        # Six trades a day for 3 days from 2014-05-04T00:00Z. Venue 'X' only trades on the 5th.
+        timestamps = [1399161600000+i*14400000 for i in range(18)]
+        venues = ['A','B','C','A','B','C', 'A','X','C','A','X','C', 'A','B','C','A','B','C']
+
+        # Only keep the distinct values of up to 3 order ids, so order_id switches to a Bloom filter
+        with mock.patch.object(tstables.index,'MAX_DISTINCT_VALUES',3):
+            ts.append({'timestamp': timestamps, 'venue': venues, 'order_id': range(100,118)})
+
+        d05 = ts.root_group.y2014.m05.d05
+        self.assertEqual(list(d05.ts_distinct_venue.read()),[b'A',b'C',b'X'])
+        self.assertIn('ts_bloom_order_id',d05)
+
+        start_dt = datetime.datetime(2014,5,1,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,31,tzinfo=pytz.utc)
+
+        with mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'venue': 'X'})
+            self.assertEqual(mock_read.call_count,1)
+        self.assertEqual(list(rows['order_id']),[107,110])
+
+        for order_id in range(100,118):
+            rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'order_id': order_id})
+            self.assertEqual(list(rows['timestamp']),[timestamps[order_id-100]])
+
+        rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'venue': 'A','order_id': 103})
+        self.assertEqual(rows.size,1)
+        self.assertEqual(ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'venue': 'Z'}).size,0)
+
+        self.assertRaises(ValueError,ts.read_range,start_dt,end_dt,where={'price': 1})
+
+        # Values that don't convert exactly to the type of the column are rejected
+        self.assertRaises(ValueError,ts.read_range,start_dt,end_dt,where={'order_id': 103.5})
+        self.assertRaises(ValueError,ts.read_range,start_dt,end_dt,where={'venue': 'ABCDE'})
+        self.assertRaises(ValueError,ts.read_range,start_dt,end_dt,where={'order_id': 'A'})
+        self.assertEqual(ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'order_id': 103.0}).size,1)
+        self.assertRaises(AttributeError,self.h5_file.create_ts,'/','A',description=Trade,
+                          indexed_columns=['timestamp'])
+
+    def test_large_index_summaries(self):
+        class Trade(tables.IsDescription):
+            timestamp = tables.Int64Col(pos=0)
+            venue = tables.StringCol(100,pos=1)
+            order_id = tables.Int64Col(pos=2)
+
+        # The distinct values of venue and the Bloom filter of order_id are both larger than the
+        # 64 KB that HDF5 allows for an attribute
+        ts = self.h5_file.create_ts('/','EURUSD',description=Trade,indexed_columns=['venue','order_id'],
+                                    expectedrows_per_partition=1000000)
+        timestamps = [1399161600000+i*60000 for i in range(1100)]
+        venues = ['venue-%03d' % (i % 900) + 'x'*80 for i in range(1100)]
+        ts.append({'timestamp': timestamps, 'venue': venues, 'order_id': range(1100)})
+
+        d04 = ts.root_group.y2014.m05.d04
+        self.assertEqual(d04.ts_distinct_venue.nrows,900)
+        self.assertEqual(d04.ts_bloom_order_id.nrows,1250000)
+
+        start_dt = datetime.datetime(2014,5,1,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,31,tzinfo=pytz.utc)
+        rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'venue': venues[500]})
+        self.assertEqual(list(rows['order_id']),[500])
+        rows = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,where={'order_id': 1099})
+        self.assertEqual(list(rows['venue']),[venues[1099].encode()])
+
+    def test_read_sample(self):
+        # One row every 20 minutes for 3 days from 2014-05-04T00:00:00Z
+        timestamps = [1399161600000+i*1200000 for i in range(216)]
+        ts,rows = self.__load_array_data(timestamps,list(range(216)))
+
+        start_dt = datetime.datetime(2014,5,4,1,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,7,tzinfo=pytz.utc)
+        in_range = rows[3:]
+
+        # Every 22nd row, continuing across partitions, read with a step
+        with mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            sample = ts.read_sample(start_dt,end_dt,10,as_pandas_dataframe=False)
+            # (Table.col reads the timestamp column to find the range with a `field` argument)
+            for call in mock_read.call_args_list:
+                if 'field' not in call[1]:
+                    self.assertEqual(call[0][3],22)
+        self.assertEqual(list(sample['price']),list(in_range['price'][::22]))
+
+        sample = ts.read_sample(start_dt,end_dt,20,method='random',seed=1,as_pandas_dataframe=False)
+        self.assertEqual(sample.size,20)
+        self.assertEqual(len(set(sample['price'])),20)
+        self.assertTrue((numpy.diff(sample['timestamp']) > 0).all())
+        self.assertTrue(set(sample['price']) <= set(in_range['price']))
+
+        # With no more than n rows in the range, all of them are returned
+        self.assertEqual(ts.read_sample(start_dt,end_dt,1000,method='random').shape[0],213)
+
+        self.assertRaises(ValueError,ts.read_sample,start_dt,end_dt,10,method='every')
+
+    def test_read_budget(self):
+        # One row every 20 minutes for 3 days from 2014-05-04T00:00:00Z. Each partition is 72 rows of 12 bytes.
+        timestamps = [1399161600000+i*1200000 for i in range(216)]
+        ts,rows = self.__load_array_data(timestamps,list(range(216)))
+
+        start_dt = datetime.datetime(2014,5,4,12,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,6,12,tzinfo=pytz.utc)
+
+        # Partitions larger than the budget are bisected and read in chunks of at most 120 bytes, without
+        # reading them whole
+        with mock.patch.object(tables.Table, 'read', autospec=True, side_effect=tables.Table.read) as mock_read:
+            chunks = list(ts.iter_range(start_dt,end_dt,as_pandas_dataframe=False,read_budget=120))
+            for call in mock_read.call_args_list:
+                self.assertTrue('field' in call[1] or call[0][2] - call[0][1] <= 10)
+        self.assertTrue(all(chunk.nbytes <= 120 for chunk in chunks))
+        self.assertEqual(list(numpy.concatenate(chunks)['price']),list(range(36,181)))
+
+        # A result larger than the budget warns
+        ts.read_budget = 1000
+        with self.assertWarns(ResourceWarning):
+            rows_read = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False)
+        self.assertEqual(list(rows_read['price']),list(range(36,181)))
+
+        rows_read = ts.read_range(start_dt,end_dt,as_pandas_dataframe=False,read_budget=10000)
+        self.assertEqual(list(rows_read['price']),list(range(36,181)))
+
+        # So does one larger than the default budget
+        ts.read_budget = None
+        with mock.patch.object(tstables.TsTable,'MAX_FULL_PARTITION_READ_SIZE',1000):
+            with self.assertWarns(ResourceWarning):
+                ts.read_range(start_dt,end_dt,as_pandas_dataframe=False)
+
+    def test_follow(self):
+        ts,rows = self.__load_array_data([1399204800000,1399248000000],[1,2])
+
+        # Rows before `since` are returned first, and a timeout ends the generator
+        follower = ts.follow(since=1399204800000,poll_interval=0.01,timeout=0.05,as_pandas_dataframe=False)
+        self.assertEqual(list(next(follower)['price']),[2])
+
+        # Rows appended to the current partition and to new partitions are each seen once, including
+        # rows with the same timestamp as the last row read
+        ts.append(numpy.array([(1399248000000,3),(1399291200000,4),(1401624000000,5)],dtype=rows.dtype))
+        self.assertEqual(list(next(follower)['price']),[3,4,5])
+        ts.append(numpy.array([(1401624000000,6)],dtype=rows.dtype))
+        self.assertEqual(list(next(follower)['price']),[6])
+        self.assertRaises(StopIteration,next,follower)
+
+        # By default, following starts at the end of the time series
+        follower = ts.follow(poll_interval=0.01,timeout=0.05)
+        ts.append(numpy.array([(1401710400000,7)],dtype=rows.dtype))
+        self.assertEqual(list(next(follower)['price']),[7])
+        self.assertEqual(list(follower),[])
+
 
 def suite():
     loader = unittest.TestLoader()
@@ -0,0 +1,80 @@
+import tables
+import tstables
+import unittest
+import datetime
+import pytz
+import tempfile
+import os
+import numpy
+
+# Class to define record structure
+class Price(tables.IsDescription):
+    timestamp = tables.Int64Col(pos=0)
+    price = tables.Int32Col(pos=1)
+
+
+class PrefetchingReaderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_file = tempfile.mkstemp('h5')[1]
+        self.h5_file = tables.open_file(self.temp_file,'r+')
+        self.ts = self.h5_file.create_ts('/','EURUSD',description=Price)
+
+        # One row every 6 hours for 6 days from 2014-05-01T00:00:00Z
+        self.rows = numpy.array([(1398902400000+i*21600000,i) for i in range(24)],
+                                dtype=[('timestamp', '<i8'), ('price', '<i4')])
+        self.ts.append(self.rows)
+
+    def tearDown(self):
+        self.h5_file.close()
+        os.remove(self.temp_file)
+
+    def __day(self,day):
+        start_dt = datetime.datetime(2014,5,day,tzinfo=pytz.utc)
+        return start_dt,start_dt + datetime.timedelta(hours=23)
+
+    def test_read_range_detects_direction(self):
+        with tstables.PrefetchingReader(self.ts,prefetch=2) as reader:
+            # Forwards, day by day. The first two reads set the direction, and are read on demand.
+            for day in range(1,7):
+                rows = reader.read_range(*self.__day(day),as_pandas_dataframe=False)
+                self.assertEqual(list(rows['price']),list(range((day-1)*4,day*4)))
+            self.assertEqual((reader.hits,reader.misses),(4,2))
+
+            # Backwards. The first read changes the direction, so the next ones are prefetched.
+            for day in [5,4,3]:
+                df = reader.read_range(*self.__day(day))
+                self.assertEqual(list(df['price']),list(range((day-1)*4,day*4)))
+            self.assertEqual((reader.hits,reader.misses),(6,3))
+
+    def test_read_range_with_direction(self):
+        with tstables.PrefetchingReader(self.ts,prefetch=1,direction='backward') as reader:
+            for day in [6,5,4]:
+                rows = reader.read_range(*self.__day(day),as_pandas_dataframe=False)
+                self.assertEqual(list(rows['price']),list(range((day-1)*4,day*4)))
+            self.assertEqual((reader.hits,reader.misses),(2,1))
+
+        self.assertRaises(ValueError,tstables.PrefetchingReader,self.ts,direction='sideways')
+
+    def test_scan(self):
+        start_dt = datetime.datetime(2014,5,1,12,tzinfo=pytz.utc)
+        end_dt = datetime.datetime(2014,5,6,tzinfo=pytz.utc)
+
+        with tstables.PrefetchingReader(self.ts,prefetch=3) as reader:
+            chunks = list(reader.scan(start_dt,end_dt,as_pandas_dataframe=False))
+            self.assertEqual(len(chunks),6)
+            self.assertEqual(list(numpy.concatenate(chunks)['price']),list(range(2,21)))
+            self.assertEqual((reader.hits,reader.misses),(5,1))
+
+            chunks = list(reader.scan(start_dt,end_dt,reverse=True))
+            self.assertEqual([list(df['price']) for df in chunks][:2],[[20],[16,17,18,19]])
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(PrefetchingReaderTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
@@ -2,88 +2,56 @@ import tstables
 import unittest
 import datetime
 import pytz
+import subprocess
+import sys
+import os
 
 class TsTableStaticTestCase(unittest.TestCase):
 
-    TIME_EPS = datetime.timedelta(microseconds=1*1000)
-
-    def test_partition_range_same_time(self):
-        # 2014-04-01 01:00:00 UTC
-        start_dt = datetime.datetime(2014,4,1,1,0,tzinfo=pytz.utc)
-
-        # End at the exact same time
-        end_dt = start_dt
-        parts = tstables.TsTable._TsTable__dtrange_to_partition_ranges(start_dt,end_dt)
-
-        # There should be only one partition, and the range should equal start_dt,end_dt
-        self.assertEqual(parts[start_dt.date()], (start_dt,end_dt))
-        self.assertEqual(len(parts.keys()), 1)
-
-    def test_partition_range_same_day(self):
-        # 2014-04-01 01:00:00 UTC
-        start_dt = datetime.datetime(2014,4,1,1,0,tzinfo=pytz.utc)
-
-        # 2014-04-01 04:00:00 UTC
-        end_dt = datetime.datetime(2014,4,1,4,0,tzinfo=pytz.utc)
-        parts = tstables.TsTable._TsTable__dtrange_to_partition_ranges(start_dt,end_dt)
-
-        # There should be only one partition, and the range should equal start_dt,end_dt + 1ms
-        self.assertEqual(parts[start_dt.date()], (start_dt,end_dt))
-        self.assertEqual(len(parts.keys()),1)
-
-    def test_partition_range_two_day(self):
-        # 2014-04-01 01:00:00 UTC
-        start_dt = datetime.datetime(2014,4,1,1,0,tzinfo=pytz.utc)
-
-        # 2014-04-02 04:00:00 UTC
-        end_dt = datetime.datetime(2014,4,2,4,0,tzinfo=pytz.utc)
-        parts = tstables.TsTable._TsTable__dtrange_to_partition_ranges(start_dt,end_dt)
-
-        # Should be two parts: [2014-04-01 01:00:00 UTC, 2014-04-01 23:59:59.999 UTC] and
-        # [2014-04-02 00:00:00 UTC, 2014-04-02 04:00:00 UTC]
-        self.assertEqual(parts[start_dt.date()][0], start_dt)
-        self.assertEqual(parts[start_dt.date()][1], datetime.datetime(2014,4,2,0,0,tzinfo=pytz.utc) - self.TIME_EPS)
-        self.assertEqual(parts[end_dt.date()][0], datetime.datetime(2014,4,2,0,0,tzinfo=pytz.utc))
-        self.assertEqual(parts[end_dt.date()][1],end_dt)
-        self.assertEqual(len(parts.keys()),2)
-
-    def test_partition_range_three_day(self):
-        # 2014-04-01 01:00:00 UTC
-        start_dt = datetime.datetime(2014,4,1,1,0,tzinfo=pytz.utc)
-
-        # 2014-04-03 04:00:00 UTC
-        end_dt = datetime.datetime(2014,4,3,4,0,tzinfo=pytz.utc)
-        parts = tstables.TsTable._TsTable__dtrange_to_partition_ranges(start_dt,end_dt)
-
-        # Should be three parts: [2014-04-01 01:00:00 UTC, 2014-04-01 23:59:59.999 UTC],
-        # [2014-04-02 00:00:00 UTC, 2014-04-02 23:59:59.999 UTC]
-        # [2014-04-03 00:00:00 UTC, 2014-04-03 04:00:00 UTC]
-        self.assertEqual(parts[start_dt.date()][0], start_dt)
-        self.assertEqual(parts[start_dt.date()][1], datetime.datetime(2014,4,2,0,0,tzinfo=pytz.utc)-self.TIME_EPS)
-
-        mid_date = start_dt.date() + datetime.timedelta(days=1)
-        self.assertEqual(parts[mid_date][0], datetime.datetime(2014,4,2,0,0,tzinfo=pytz.utc))
-        self.assertEqual(parts[mid_date][1], datetime.datetime(2014,4,3,0,0,tzinfo=pytz.utc)-self.TIME_EPS)
-
-        self.assertEqual(parts[end_dt.date()][0], datetime.datetime(2014,4,3,0,0,tzinfo=pytz.utc))
-        self.assertEqual(parts[end_dt.date()][1], end_dt)
-        self.assertEqual(len(parts.keys()),3)
-
-    def test_partition_range_just_cross_boundary(self):
-        # 2014-03-31 23:59:59.999 UTC
-        start_dt = datetime.datetime(2014,3,31,23,59,59,999*1000,tzinfo=pytz.utc)
-
-        # 2014-04-01 00:00:00.001 UTC
-        end_dt = datetime.datetime(2014,4,1,0,0,0,1*1000,tzinfo=pytz.utc)
-        parts = tstables.TsTable._TsTable__dtrange_to_partition_ranges(start_dt,end_dt)
-
-        # Should be two parts: [2014-03-31 23:59:59.999 UTC, 2014-03-31 23:59:59.999 UTC] and
-        # [2014-04-01 00:00:00 UTC, 2014-04-01 00:00:00.001 UTC]
-        self.assertEqual(parts[start_dt.date()][0], start_dt)
-        self.assertEqual(parts[start_dt.date()][1], datetime.datetime(2014,4,1,0,0,tzinfo=pytz.utc) - self.TIME_EPS)
-        self.assertEqual(parts[end_dt.date()][0], datetime.datetime(2014,4,1,0,0,tzinfo=pytz.utc))
-        self.assertEqual(parts[end_dt.date()][1], end_dt)
-        self.assertEqual(len(parts.keys()),2)
+    def __partition_bounds(self,ts_table,partition_dt):
+        # The first and last datetimes (to the millisecond) of a partition
+        start_ts = ts_table._TsTable__partition_start_ts(partition_dt)
+        end_ts = ts_table._TsTable__partition_start_ts(partition_dt + datetime.timedelta(days=1)) - 1
+        return (tstables.TsTable._TsTable__ts_to_dt(start_ts),tstables.TsTable._TsTable__ts_to_dt(end_ts))
+
+    def __partition_date(self,ts_table,dt):
+        return ts_table._TsTable__ts_to_partition_date(tstables.TsTable._TsTable__dt_to_ts(dt))
+
+    def test_utc_partitions(self):
+        ts_table = tstables.TsTable(None,None,None)
+
+        # Partitions run from midnight to midnight UTC
+        self.assertEqual(self.__partition_bounds(ts_table,datetime.date(2014,4,1)),
+                         (datetime.datetime(2014,4,1,tzinfo=pytz.utc),
+                          datetime.datetime(2014,4,1,23,59,59,999*1000,tzinfo=pytz.utc)))
+
+        # Just either side of the boundary
+        self.assertEqual(self.__partition_date(ts_table,datetime.datetime(2014,3,31,23,59,59,999*1000,tzinfo=pytz.utc)),
+                         datetime.date(2014,3,31))
+        self.assertEqual(self.__partition_date(ts_table,datetime.datetime(2014,4,1,tzinfo=pytz.utc)),
+                         datetime.date(2014,4,1))
+        self.assertEqual(self.__partition_date(ts_table,datetime.datetime(1969,12,31,12,tzinfo=pytz.utc)),
+                         datetime.date(1969,12,31))
+
+    def test_session_aligned_partitions(self):
+        # Partitions from 17:00 to 17:00 New York time, named after the day the session ends
+        ts_table = tstables.TsTable(None,None,None,partition_tz='America/New_York',
+                                    partition_offset=datetime.timedelta(hours=-7))
+
+        # 2014-03-09 is the day daylight saving time starts, so that session is 23 hours long
+        self.assertEqual(self.__partition_bounds(ts_table,datetime.date(2014,3,9)),
+                         (datetime.datetime(2014,3,8,22,tzinfo=pytz.utc),
+                          datetime.datetime(2014,3,9,20,59,59,999*1000,tzinfo=pytz.utc)))
+        self.assertEqual(self.__partition_bounds(ts_table,datetime.date(2014,3,10)),
+                         (datetime.datetime(2014,3,9,21,tzinfo=pytz.utc),
+                          datetime.datetime(2014,3,10,20,59,59,999*1000,tzinfo=pytz.utc)))
+
+        self.assertEqual(self.__partition_date(ts_table,datetime.datetime(2014,3,9,20,59,59,999*1000,tzinfo=pytz.utc)),
+                         datetime.date(2014,3,9))
+        self.assertEqual(self.__partition_date(ts_table,datetime.datetime(2014,3,9,21,tzinfo=pytz.utc)),
+                         datetime.date(2014,3,10))
+        self.assertEqual(self.__partition_date(ts_table,datetime.datetime(2014,1,5,22,tzinfo=pytz.utc)),
+                         datetime.date(2014,1,6))
 
     def test_dt_to_ts(self):
         # Test 1 - Epoch
@@ -129,6 +97,32 @@ class TsTableStaticTestCase(unittest.TestCase):
         expected = ['y2014','m05','d05']
         for idx,p in enumerate(pa):
             assert p == expected[idx]
+    def test_numpy_only_path_does_not_import_pandas(self):
+        # Run in a new interpreter, since the tests themselves import pandas
+        script = """
+import datetime, os, sys, tempfile
+import numpy, tables, tstables
+
+class Price(tables.IsDescription):
+    timestamp = tables.Int64Col(pos=0)
+    price = tables.Int32Col(pos=1)
+
+fd,path = tempfile.mkstemp('h5')
+os.close(fd)
+with tables.open_file(path,'r+') as f:
+    ts = f.create_ts('/','EURUSD',description=Price)
+    ts.append(numpy.array([(1399251661100,1)],dtype=[('timestamp','<i8'),('price','<i4')]))
+    ts.read_range(datetime.datetime(2014,5,5),datetime.datetime(2014,5,6),as_pandas_dataframe=False)
+os.remove(path)
+
+assert 'pandas' not in sys.modules
+assert 'tstables.benchmark' not in sys.modules
+"""
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join([os.path.dirname(os.path.dirname(tstables.__file__))] +
+                                            [p for p in [env.get('PYTHONPATH')] if p])
+        subprocess.check_call([sys.executable,'-c',script],env=env)
+
 
 def suite():
     loader = unittest.TestLoader()
@@ -0,0 +1,94 @@
+import tables
+import tstables
+import unittest
+import datetime
+import pytz
+import tempfile
+import shutil
+import os
+import numpy
+import mock
+import multiprocessing
+
+# Class to define record structure
+class Price(tables.IsDescription):
+    timestamp = tables.Int64Col(pos=0)
+    price = tables.Int32Col(pos=1)
+
+
+class TsStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+        # One row every 10 days from 2014-01-01T00:00:00Z, so the rows span three months
+        self.rows = numpy.array([(1388534400000+i*864000000,i) for i in range(9)],
+                                dtype=[('timestamp', '<i8'), ('price', '<i4')])
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_append_shards_by_month(self):
+        with tstables.TsStore.create(self.temp_dir,'EURUSD',Price,shard_by='month') as store:
+            store.append(self.rows[:4])
+            store.append(self.rows[4:])
+
+            self.assertEqual(sorted(store.manifest['shards'].keys()),['2014-01','2014-02','2014-03'])
+            self.assertEqual(store.min_dt(),datetime.datetime(2014,1,1,tzinfo=pytz.utc))
+            self.assertEqual(store.max_dt(),datetime.datetime(2014,3,22,tzinfo=pytz.utc))
+
+            rows_read = store.read_range(datetime.datetime(2014,1,15),datetime.datetime(2014,3,1),
+                                         as_pandas_dataframe=False)
+            self.assertEqual(list(rows_read['price']),[2,3,4,5])
+
+        # Each shard is a regular TsTables file
+        with tables.open_file(os.path.join(self.temp_dir,'EURUSD_2014-02.h5'),'r') as h5_file:
+            ts = h5_file.root.EURUSD._f_get_timeseries()
+            self.assertEqual(ts.min_dt(),datetime.datetime(2014,2,10,tzinfo=pytz.utc))
+
+    def test_read_only_store_reads_shards_in_parallel(self):
+        with tstables.TsStore.create(self.temp_dir,'EURUSD',Price,shard_by='month') as store:
+            store.append(self.rows)
+
+        with tstables.TsStore(self.temp_dir,max_workers=2) as store:
+            self.assertEqual(store.shard_by,'month')
+
+            # min_dt opens a shard file, so workers must not be forked from this process
+            self.assertEqual(store.min_dt(),datetime.datetime(2014,1,1,tzinfo=pytz.utc))
+            get_context = multiprocessing.get_context
+            with mock.patch.object(multiprocessing,'get_context',side_effect=get_context) as mock_get_context:
+                rows_read = store.read_range(datetime.datetime(2013,12,1),datetime.datetime(2015,1,1),
+                                             as_pandas_dataframe=False)
+                mock_get_context.assert_called_once_with('spawn')
+            self.assertEqual(list(rows_read['price']),list(range(9)))
+
+    def test_append_before_end_of_store(self):
+        with tstables.TsStore.create(self.temp_dir,'EURUSD',Price,shard_by='month') as store:
+            store.append(self.rows[4:])
+            self.assertRaises(ValueError,store.append,self.rows[:4])
+
+    def test_append_unsorted_rows(self):
+        with tstables.TsStore.create(self.temp_dir,'EURUSD',Price,shard_by='month') as store:
+            # Unsorted across the boundary between the January and February shards
+            self.assertRaises(ValueError,store.append,self.rows[[2,4,3]])
+            self.assertEqual(store.manifest['shards'],{})
+
+            # Rows that can't all be converted aren't appended to any shard
+            self.assertRaises(ValueError,store.append,{'timestamp': self.rows['timestamp'],
+                                                       'price': [1]*8 + ['x']})
+            self.assertEqual(store.manifest['shards'],{})
+
+            store.append({'timestamp': self.rows['timestamp'], 'price': self.rows['price']})
+            rows_read = store.read_range(datetime.datetime(2014,1,1),datetime.datetime(2015,1,1),
+                                         as_pandas_dataframe=False)
+            self.assertEqual(list(rows_read['price']),list(range(9)))
+
+
+def suite():
+    loader = unittest.TestLoader()
+    suite = unittest.TestSuite()
+    suite.addTest(loader.loadTestsFromTestCase(TsStoreTestCase))
+    return suite
+
+if __name__ == '__main__':
+    unittest.TextTestRunner(verbosity=2).run(suite())
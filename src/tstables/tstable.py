@@ -1,22 +1,30 @@
-import pytz
 import datetime
 import tables
 import numpy
-import numpy.lib.recfunctions
-import pandas
 import re
+import sys
+import time
+import warnings
+import zoneinfo
+from tstables import arrow
+from tstables import index
+from tstables import locks
+from tstables import readers
 
 class TsTable:
-    EPOCH = datetime.datetime(1970,1,1,tzinfo=pytz.utc)
+    EPOCH = datetime.datetime(1970,1,1,tzinfo=datetime.timezone.utc)
 
     # Partition size is one day (in milliseconds)
     PARTITION_SIZE = numpy.int64(86400000)
 
-    # The maximum partition size to read completely into memory before using Table.read_where.
+    # The default read budget (in bytes): partitions up to this size are read completely into
+    # memory, and larger ones are read in chunks of about this size. See `read_budget`.
     MAX_FULL_PARTITION_READ_SIZE = 25*1e6
 
     def __init__(self,pt_file,root_group,description,title="",filters=None,
-        expectedrows_per_partition=10000,chunkshape=None,byteorder=None):
+        expectedrows_per_partition=10000,chunkshape=None,byteorder=None,cache=None,
+        partition_offset=None,partition_tz=None,timestamp_encoding=None,indexed_columns=None,
+        read_budget=None):
         self.file = pt_file
         self.root_group = root_group
         self.table_description = description
@@ -26,49 +34,29 @@ class TsTable:
         self.table_chunkshape = chunkshape
         self.table_byteorder = byteorder
 
-    @classmethod
-    def __tsrange_to_partition_ranges(self,start_ts,end_ts):
-        start_partition = start_ts // self.PARTITION_SIZE
-        end_partition = end_ts // self.PARTITION_SIZE
-
-        # Handle the special case when there is only one partition
-        if start_partition == end_partition:
-            return {start_partition: (start_ts, end_ts)}
-
-        partition_ranges = {}
-        for p in range(start_partition,end_partition+1):
-            if p == start_partition:
-                # append truncated range from start_ts to the end of the partition
-                partition_ranges[p] = tuple((start_ts, (start_partition+1)*self.PARTITION_SIZE-1))
-            elif p == end_partition:
-                # append truncated range from start of the partition to end_ts
-                partition_ranges[p] = tuple(((end_partition*self.PARTITION_SIZE), end_ts))
-            else:
-                partition_ranges[p] = tuple((p*self.PARTITION_SIZE, (p+1)*self.PARTITION_SIZE - 1))
-
-        return partition_ranges
+        # Optional PartitionCache of decoded partitions
+        self.cache = cache
 
+        # Bytes that range reads may read from a partition at a time, or None for the default of
+        # MAX_FULL_PARTITION_READ_SIZE
+        self.read_budget = read_budget
 
+        # Partition boundaries. The partition for day D starts at midnight of D in partition_tz (a
+        # time zone name, or UTC if None) plus partition_offset (a timedelta).
+        self.partition_offset = partition_offset or datetime.timedelta(0)
+        self.partition_tz = partition_tz
+        self.__partition_zone = datetime.timezone.utc if partition_tz is None \
+            else zoneinfo.ZoneInfo(partition_tz)
 
-    @classmethod
-    def __dtrange_to_partition_ranges(self,start_dt,end_dt):
+        # How the timestamp column is stored in partition tables: None (int64 milliseconds), or
+        # 'offset32' (int32 milliseconds from the partition's base timestamp, which is stored as an
+        # attribute of the table). Rows are always read and appended with int64 timestamps.
+        self.timestamp_encoding = timestamp_encoding
 
-        # We assume that start_dt and end_dt are in UTC at this point
-        start_ts = self.__dt_to_ts(start_dt)
-        end_ts = self.__dt_to_ts(end_dt)
+        # Columns with a per-partition summary of their values (see tstables.index), which lets
+        # read_range skip partitions that can't match `where`
+        self.indexed_columns = list(indexed_columns or [])
 
-        ts_partitions = self.__tsrange_to_partition_ranges(start_ts,end_ts)
-
-        dt_partitions = {}
-
-        for k in ts_partitions.keys():
-            day = self.__ts_to_dt(k*self.PARTITION_SIZE).date()
-            s_ts = ts_partitions[k][0]
-            e_ts = ts_partitions[k][1]
-            dt_partitions[day] = tuple((self.__ts_to_dt(s_ts),self.__ts_to_dt(e_ts)))
-
-        return dt_partitions
-    
     @classmethod
     def __dt_to_ts(self,dt):
         delta = dt - self.EPOCH
@@ -92,28 +80,207 @@ class TsTable:
     def __v_dtype(self):
         return tables.description.dtype_from_descr(self.table_description)
 
-    def __fetch_rows_from_partition(self,partition_date,start_dt,end_dt):
-        try:
-            y_group = self.root_group._v_groups[partition_date.strftime('y%Y')]
-            m_group = y_group._v_groups[partition_date.strftime('m%m')]
-            d_group = m_group._v_groups[partition_date.strftime('d%d')]
-        except KeyError:
-            # If the partition group is missing, then return an empty array
-            return numpy.ndarray(shape=0,dtype=self.__v_dtype())
-
-        # It is faster to fetch the entire partition into memory and process it with NumPy than to
-        # use Table.read_where. However, Table.read_where might be needed for very large partitions
-        # where memory usage is a concern.
-        if d_group.ts_data.rowsize * d_group.ts_data.nrows < TsTable.MAX_FULL_PARTITION_READ_SIZE:
-            p_data = d_group.ts_data.read()
-            start_ts = self.__dt_to_ts(start_dt)
-            end_ts = self.__dt_to_ts(end_dt)
+    def __stored_dtype(self):
+        """Returns the dtype of the partition tables, which differs from the dtype of the rows when
+        timestamps are encoded
+        """
+
+        dtype = self.__v_dtype()
+        if self.timestamp_encoding is None:
+            return dtype
+
+        return numpy.dtype([('timestamp',numpy.int32)] +
+                           [(name,dtype[name]) for name in dtype.names[1:]])
+
+    @staticmethod
+    def __timestamp_base(ts_data):
+        return numpy.int64(ts_data.attrs._TS_TABLES_TIMESTAMP_BASE)
+
+    def __read_table(self,ts_data,start=None,stop=None,step=None):
+        """Reads rows from a partition table, decoding their timestamps
+        """
+
+        return self.__decode_rows(ts_data,ts_data.read(start,stop,step))
+
+    def __decode_rows(self,ts_data,rows):
+        if self.timestamp_encoding is None:
+            return rows
+
+        decoded = numpy.empty(shape=rows.shape,dtype=self.__v_dtype())
+        decoded['timestamp'] = rows['timestamp'] + self.__timestamp_base(ts_data)
+        for name in rows.dtype.names[1:]:
+            decoded[name] = rows[name]
+
+        return decoded
+
+    def __encode_rows(self,ts_data,rows):
+        if self.timestamp_encoding is None:
+            return rows
+
+        encoded = numpy.empty(shape=rows.shape,dtype=ts_data.dtype)
+        encoded['timestamp'] = rows['timestamp'] - self.__timestamp_base(ts_data)
+        for name in rows.dtype.names[1:]:
+            encoded[name] = rows[name]
+
+        return encoded
+
+    def __timestamp_at(self,ts_data,idx):
+        """Returns the (decoded) timestamp of one row of a partition table
+        """
+
+        ts = numpy.int64(ts_data.cols.timestamp[idx])
+        if self.timestamp_encoding is not None:
+            ts += self.__timestamp_base(ts_data)
+
+        return ts
+
+    def __stored_timestamps(self,ts_data,values):
+        """Encodes timestamps the way they are stored in a partition table, so that its timestamp
+        column can be bisected or queried without decoding it. Out of range values are clipped.
+        """
+
+        if self.timestamp_encoding is None:
+            return values
+
+        limits = numpy.iinfo(numpy.int32)
+        return numpy.clip(numpy.asarray(values,dtype=numpy.int64) - self.__timestamp_base(ts_data),
+                          limits.min,limits.max)
+
+    def __search_timestamps(self,ts_data,values,side):
+        """Bisects the timestamp column of a partition table for the given timestamps
+        """
+
+        return numpy.searchsorted(ts_data.col('timestamp'),self.__stored_timestamps(ts_data,values),
+                                  side=side)
+
+    def __iter_rows_from_partition(self,partition_date,start_ts,end_ts,budget):
+        """Yields the rows of a partition between start_ts and end_ts, reading at most about `budget`
+        bytes at a time
+
+        A partition that fits in the budget is read whole (or taken from the cache) and sliced in
+        memory, which is fastest. For a larger partition, the rows in the range are found by
+        bisecting the table with single-row reads, and then read in chunks of at most `budget` bytes
+        (one chunk if they fit).
+        """
+
+        ts_data = self.__fetch_partition_table(partition_date)
+        if ts_data is None or ts_data.nrows == 0:
+            return
+
+        p_data = None
+        if self.cache is not None:
+            p_data = self.cache.get(self.__cache_key(partition_date))
+
+        if p_data is None and ts_data.rowsize * ts_data.nrows < budget:
+            p_data = self.__read_table(ts_data)
+            if self.cache is not None:
+                self.cache.put(self.__cache_key(partition_date),p_data)
+
+        if p_data is not None:
             start_idx = numpy.searchsorted(p_data['timestamp'], start_ts, side='left')
             end_idx = numpy.searchsorted(p_data['timestamp'], end_ts, side='right')
-            return p_data[start_idx:end_idx]
-        else:
-            return d_group.ts_data.read_where('(timestamp >= {0}) & (timestamp <= {1})'.format(
-                self.__dt_to_ts(start_dt),self.__dt_to_ts(end_dt)))
+            yield p_data[start_idx:end_idx]
+            return
+
+        start_idx = self.__bisect_rows(ts_data,start_ts,'left')
+        end_idx = self.__bisect_rows(ts_data,end_ts,'right')
+        rows_per_chunk = max(int(budget // ts_data.rowsize),1)
+        for chunk_start in range(start_idx,end_idx,rows_per_chunk):
+            yield self.__read_table(ts_data,chunk_start,min(chunk_start+rows_per_chunk,end_idx))
+
+    def __bisect_rows(self,ts_data,ts,side):
+        """Like numpy.searchsorted on the timestamp column of a partition table, but reads only the
+        O(log n) timestamps that it compares with
+        """
+
+        ts = self.__stored_timestamps(ts_data,ts)
+        lo,hi = 0,ts_data.nrows
+        while lo < hi:
+            mid = (lo + hi) // 2
+            value = ts_data.read(mid,mid+1,field='timestamp')[0]
+            if value < ts or (side == 'right' and value == ts):
+                lo = mid + 1
+            else:
+                hi = mid
+
+        return lo
+
+    def __cache_key(self,partition_dt):
+        return (self.file.filename,self.root_group._v_pathname,partition_dt)
+
+    def __iter_partition_dates(self,reverse=False,first_dt=None,last_dt=None):
+        """Yields the dates of the existing partitions in chronological order (or reverse order)
+
+        Group names are zero-padded, so sorting the names of the year, month and day groups sorts
+        them by date. Groups are only visited as the generator advances. If first_dt or last_dt
+        are given, only partitions between those dates (inclusive) are yielded, and year and month
+        groups outside of them are not visited.
+        """
+        first_dt = first_dt or datetime.date.min
+        last_dt = last_dt or datetime.date.max
+
+        y_names = [n for n in self.root_group._v_groups.keys() if re.match('y[0-9]{4}$',n)
+                   and first_dt.year <= int(n[1:]) <= last_dt.year]
+        for y_name in sorted(y_names,reverse=reverse):
+            year = int(y_name[1:])
+            y_group = self.root_group._v_groups[y_name]
+            m_names = [n for n in y_group._v_groups.keys() if re.match('m[0-9]{2}$',n)
+                       and (first_dt.year,first_dt.month) <= (year,int(n[1:])) <= (last_dt.year,last_dt.month)]
+            for m_name in sorted(m_names,reverse=reverse):
+                m_group = y_group._v_groups[m_name]
+                d_names = [n for n in m_group._v_groups.keys() if re.match('d[0-9]{2}$',n)]
+                for d_name in sorted(d_names,reverse=reverse):
+                    partition_dt = datetime.date(year,int(m_name[1:]),int(d_name[1:]))
+                    if first_dt <= partition_dt <= last_dt:
+                        yield partition_dt
+
+    def __iter_partitions_in_range(self,start_ts,end_ts):
+        """Yields (partition date, table, covered) for each existing partition that overlaps the
+        range from start_ts to end_ts (inclusive). `covered` is True when all of the partition is in
+        the range.
+        """
+
+        for partition_dt in self.__iter_partition_dates(first_dt=self.__ts_to_partition_date(start_ts),
+                                                        last_dt=self.__ts_to_partition_date(end_ts)):
+            p_start_ts = self.__partition_start_ts(partition_dt)
+            p_end_ts = self.__partition_start_ts(partition_dt + datetime.timedelta(days=1)) - 1
+            covered = start_ts <= p_start_ts and p_end_ts <= end_ts
+            yield partition_dt,self.__fetch_partition_table(partition_dt),covered
+
+    def __row_span(self,ts_data,start_ts,end_ts):
+        """Returns the (start, stop) row indices of the rows of a partition table between start_ts and
+        end_ts (inclusive), bisecting just its timestamp column
+        """
+
+        timestamps = ts_data.col('timestamp')
+        start_ts,end_ts = self.__stored_timestamps(ts_data,[start_ts,end_ts])
+        return (numpy.searchsorted(timestamps, start_ts, side='left'),
+                numpy.searchsorted(timestamps, end_ts, side='right'))
+
+    def __partition_start_ts(self,partition_dt):
+        """Returns the first timestamp (in milliseconds) that belongs to a partition
+        """
+
+        # Adding the offset to a local time keeps the wall clock time, so a partition that starts at
+        # 17:00 New York time does so on both sides of a daylight saving time change
+        midnight = datetime.datetime(partition_dt.year,partition_dt.month,partition_dt.day,
+                                     tzinfo=self.__partition_zone)
+        return self.__dt_to_ts(midnight + self.partition_offset)
+
+    def __ts_to_partition_date(self,ts):
+        """Returns the date of the partition that a timestamp (in milliseconds) belongs to
+        """
+
+        local_dt = self.__ts_to_dt(ts).astimezone(self.__partition_zone)
+        partition_dt = (local_dt - self.partition_offset).date()
+
+        # Around daylight saving time changes, the local date can be a day off
+        if ts < self.__partition_start_ts(partition_dt):
+            partition_dt -= datetime.timedelta(days=1)
+        elif ts >= self.__partition_start_ts(partition_dt + datetime.timedelta(days=1)):
+            partition_dt += datetime.timedelta(days=1)
+
+        return partition_dt
 
     def __fetch_first_table(self):
         y_group = self.root_group._f_list_nodes()[0]
@@ -122,77 +289,30 @@ class TsTable:
         return d_group.ts_data
 
     def __fetch_last_table(self):
-        y_group = sorted(self.root_group._f_list_nodes(), key=lambda x: x._v_name)[-1]
-        m_group = sorted(y_group._f_list_nodes(), key=lambda x: x._v_name)[-1]
-        d_group = sorted(m_group._f_list_nodes(), key=lambda x: x._v_name)[-1]
-        return d_group.ts_data
+        return self.__fetch_partition_table(next(self.__iter_partition_dates(reverse=True)))
 
-    def __get_max_ts(self):
-        max_group_dt = None
-        max_ts = None
-        for group in self.root_group._f_walk_groups():
-            m = re.search('y([0-9]{4})/m([0-9]{2})/d([0-9]{2})',group._v_pathname)
-            if m is not None:
-                group_dt = datetime.date(int(m.group(1)),int(m.group(2)),int(m.group(3)))
-            else:
-                continue
+    def __iter_nonempty_tables(self,reverse=False):
+        """Yields (partition date, table) for each partition that has rows
 
-            if (max_group_dt is not None) and (max_group_dt < group_dt):
-                
-                if group.ts_data.nrows == 0:
-                    group_max_ts = None
-                else:
-                    group_max_ts = group.ts_data.cols.timestamp[-1]
-
-                if (group_max_ts is not None) and (max_ts is None or max_ts < group_max_ts):
-                    max_ts = group_max_ts
-                    max_group_dt = group_dt
-            elif (max_group_dt is None):
-            
-                if group.ts_data.nrows == 0:
-                    group_max_ts = None
-                else:
-                    group_max_ts = group.ts_data.cols.timestamp[-1]
-
-                if (group_max_ts is not None):
-                    max_ts = group_max_ts
-                    max_group_dt = group_dt
+        Empty partitions are skipped using `Table.nrows`, so none of their rows are read.
+        """
 
-        
-        return max_ts
+        for partition_dt in self.__iter_partition_dates(reverse=reverse):
+            ts_data = self.__fetch_partition_table(partition_dt)
+            if ts_data.nrows > 0:
+                yield partition_dt,ts_data
 
-    def __get_min_ts(self):
-        min_group_dt = None
-        min_ts = None
-        for group in self.root_group._f_walk_groups():
-            m = re.search('y([0-9]{4})/m([0-9]{2})/d([0-9]{2})',group._v_pathname)
-            if m is not None:
-                group_dt = datetime.date(int(m.group(1)),int(m.group(2)),int(m.group(3)))
-            else:
-                continue
+    def __get_max_ts(self):
+        for partition_dt,ts_data in self.__iter_nonempty_tables(reverse=True):
+            return self.__timestamp_at(ts_data,-1)
 
-            if (min_group_dt is not None) and (min_group_dt > group_dt):
-                if group.ts_data.nrows == 0:
-                    group_min_ts = None
-                else:
-                    group_min_ts = group.ts_data.cols.timestamp[0]
-
-                if (group_min_ts is not None) and (min_ts is None or min_ts > group_min_ts):
-                    min_ts = group_min_ts
-                    min_group_dt = group_dt
-            elif (min_group_dt is None):
-                
-                if group.ts_data.nrows == 0:
-                    group_min_ts = None
-                else:
-                    group_min_ts = group.ts_data.cols.timestamp[0]
+        return None
 
-                if (group_min_ts is not None):
-                    min_ts = group_min_ts
-                    min_group_dt = group_dt
+    def __get_min_ts(self):
+        for partition_dt,ts_data in self.__iter_nonempty_tables():
+            return self.__timestamp_at(ts_data,0)
 
-        
-        return min_ts
+        return None
 
     def min_dt(self):
         return self.__ts_to_dt(self.__get_min_ts())
@@ -200,47 +320,680 @@ class TsTable:
     def max_dt(self):
         return self.__ts_to_dt(self.__get_max_ts())
 
-    def read_range(self,start_dt,end_dt,as_pandas_dataframe=True):
+    def read_range(self,start_dt,end_dt,as_pandas_dataframe=True,output=None,where=None,
+        read_budget=None):
+        """Returns the rows between start_dt and end_dt (inclusive)
+
+        By default, the rows are returned as a pandas DataFrame with a DatetimeIndex, or as a NumPy
+        structured array when `as_pandas_dataframe` is False. `output` overrides this and can be
+        'pandas', 'numpy' or 'arrow' (a pyarrow Table, which requires pyarrow).
+
+        `where` is an optional dict that maps column names to values, and selects only the rows
+        equal to all of them. Partitions whose index (see `indexed_columns` in `create_ts`) shows
+        they can't have such rows are skipped without being read.
+
+        `read_budget` (or the `read_budget` of the TsTable, or else MAX_FULL_PARTITION_READ_SIZE) is
+        the number of bytes to read from a partition at a time (see `iter_range`). If the result is
+        larger, a ResourceWarning is issued.
+        """
+
+        output = self.__output_format(as_pandas_dataframe,output)
+        start_dt,end_dt = self.__utc_range(start_dt,end_dt)
+        self.__check_where(where)
+
+        budget = read_budget or self.read_budget or TsTable.MAX_FULL_PARTITION_READ_SIZE
+        chunks = []
+        nbytes = 0
+        for rows in self.__iter_partition_rows(start_dt,end_dt,where,budget):
+            chunks.append(rows)
+            nbytes += rows.nbytes
+            if nbytes > budget and nbytes - rows.nbytes <= budget:
+                warnings.warn("read_range result is larger than the read budget of %d bytes; use "
+                              "iter_range to read it in chunks" % budget,ResourceWarning,stacklevel=2)
+
+        # Build the Arrow table from the partitions directly, rather than concatenating them first
+        if output == 'arrow':
+            return arrow.rows_to_table(chunks,arrow.schema_from_dtype(self.__v_dtype()))
+
+        # Start with an empty array
+        result = numpy.concatenate([numpy.ndarray(shape=0,dtype=self.__v_dtype())] + chunks)
+
+        # Turn into a pandas DataFrame with a timeseries index
+        if output == 'pandas':
+            result = self.__to_dataframe(result)
+
+        return result
+
+    def iter_range(self,start_dt,end_dt,as_pandas_dataframe=True,output=None,where=None,
+        read_budget=None):
+        """Like `read_range`, but returns an iterator that yields the rows one partition at a time
+
+        Only partitions with rows in the range produce a chunk, so a long range can be processed
+        without holding all of it in memory. A partition larger than `read_budget` bytes (or the
+        `read_budget` of the TsTable, which defaults to MAX_FULL_PARTITION_READ_SIZE) produces
+        several chunks of at most that size. With output='arrow', the chunks are pyarrow
+        RecordBatches.
+        """
+
+        # Validate the range here rather than in a generator so that errors are raised immediately
+        output = self.__output_format(as_pandas_dataframe,output)
+        start_dt,end_dt = self.__utc_range(start_dt,end_dt)
+        self.__check_where(where)
+        chunks = self.__iter_partition_rows(start_dt,end_dt,where,read_budget or self.read_budget)
+
+        if output == 'pandas':
+            return (self.__to_dataframe(rows) for rows in chunks)
+        elif output == 'arrow':
+            schema = arrow.schema_from_dtype(self.__v_dtype())
+            return (arrow.rows_to_record_batch(rows,schema) for rows in chunks)
+
+        return chunks
+
+    @staticmethod
+    def __output_format(as_pandas_dataframe,output):
+        if output is None:
+            return 'pandas' if as_pandas_dataframe else 'numpy'
+
+        if output not in ('pandas','numpy','arrow'):
+            raise ValueError("output must be 'pandas', 'numpy' or 'arrow'")
+
+        return output
+
+    def __utc_range(self,start_dt,end_dt):
         # Convert start_dt and end_dt to UTC if they are naive
         if start_dt.tzinfo is None:
-            start_dt = pytz.utc.localize(start_dt)
+            start_dt = start_dt.replace(tzinfo=datetime.timezone.utc)
         if end_dt.tzinfo is None:
-            end_dt = pytz.utc.localize(end_dt)
-
+            end_dt = end_dt.replace(tzinfo=datetime.timezone.utc)
 
         if start_dt > end_dt:
             raise AttributeError('start_dt must be <= end_dt')
-        
 
-        partitions = self.__dtrange_to_partition_ranges(start_dt,end_dt)
-        sorted_pkeys = sorted(partitions.keys())
+        return start_dt,end_dt
+
+    def __check_where(self,where):
+        dtype = self.__v_dtype()
+        for column,value in (where or {}).items():
+            if column not in dtype.names:
+                raise ValueError("no column named '%s'" % column)
+
+            # Values are compared in the type of the column, so they must convert to it exactly
+            # (for example, 1.5 would otherwise match 1 in an integer column)
+            try:
+                original = numpy.asarray(value)
+                fits = bool(numpy.asarray(value,dtype=dtype[column]).astype(original.dtype) == original)
+            except (ValueError,TypeError,OverflowError):
+                fits = False
+            if not fits:
+                raise ValueError("%r is not a valid value for column '%s'" % (value,column))
+
+    def __iter_partition_rows(self,start_dt,end_dt,where=None,budget=None):
+        """Yields the non-empty arrays of rows between start_dt and end_dt (and, if given, matching
+        `where`), one per partition, or several per partition if it is larger than `budget` bytes
+        """
 
-        # Start with an empty array
-        result = numpy.ndarray(shape=0,dtype=self.__v_dtype())
+        if budget is None:
+            budget = TsTable.MAX_FULL_PARTITION_READ_SIZE
 
-        for p in sorted_pkeys:
-            result = numpy.concatenate(
-                (result,self.__fetch_rows_from_partition(p,start_dt,end_dt)))
+        start_ts = self.__dt_to_ts(start_dt)
+        end_ts = self.__dt_to_ts(end_dt)
+        first_dt = self.__ts_to_partition_date(start_ts)
+        last_dt = self.__ts_to_partition_date(end_ts)
+
+        for p in self.__iter_partition_dates(first_dt=first_dt,last_dt=last_dt):
+            if where and not self.__may_match(self.__fetch_partition_table(p),where):
+                continue
+
+            for rows in self.__iter_rows_from_partition(p,start_ts,end_ts,budget):
+                if where:
+                    mask = numpy.ones(rows.size,dtype=bool)
+                    for column,value in where.items():
+                        # Compare in the column's type, so that str values match bytes columns
+                        mask &= rows[column] == numpy.asarray(value,dtype=rows.dtype[column])
+                    rows = rows[mask]
+
+                if rows.size > 0:
+                    yield rows
+
+    def read_last(self,n,as_pandas_dataframe=True):
+        """Returns the last `n` rows of the time series (or fewer, if it has less than `n` rows)
+
+        Partitions are walked backwards from the end and only the needed rows of each partition
+        are read.
+        """
+
+        chunks = []
+        remaining = n
+
+        for partition_dt,ts_data in self.__iter_nonempty_tables(reverse=True):
+            start = max(ts_data.nrows - remaining, 0)
+            chunks.append(self.__read_table(ts_data,start,ts_data.nrows))
+            remaining -= ts_data.nrows - start
+            if remaining <= 0:
+                break
+
+        chunks.reverse()
+        result = numpy.concatenate([numpy.ndarray(shape=0,dtype=self.__v_dtype())] + chunks)
+
+        if as_pandas_dataframe:
+            result = self.__to_dataframe(result)
+
+        return result
+
+    def read_first(self,n,as_pandas_dataframe=True):
+        """Returns the first `n` rows of the time series (or fewer, if it has less than `n` rows)
+
+        Partitions are walked forwards from the start and only the needed rows of each partition
+        are read.
+        """
+
+        chunks = []
+        remaining = n
+
+        for partition_dt,ts_data in self.__iter_nonempty_tables():
+            stop = min(remaining, ts_data.nrows)
+            chunks.append(self.__read_table(ts_data,0,stop))
+            remaining -= stop
+            if remaining <= 0:
+                break
+
+        result = numpy.concatenate([numpy.ndarray(shape=0,dtype=self.__v_dtype())] + chunks)
+
+        if as_pandas_dataframe:
+            result = self.__to_dataframe(result)
+
+        return result
+
+    def read_since(self,last_ts,as_pandas_dataframe=True):
+        """Returns the rows with a timestamp after `last_ts` (a datetime, or int64 milliseconds since
+        the epoch), or all rows if `last_ts` is None
+
+        Only the partitions from the one that holds `last_ts` onwards are visited, and only the
+        timestamp column of that first partition is bisected, so reading the tail of a long time
+        series is cheap. Rows appended later with a timestamp equal to `last_ts` are not returned by
+        a subsequent call; use `follow` to see every appended row exactly once.
+        """
+
+        chunks,cursor = self.__read_since(last_ts)
+        return self.__rows_from_chunks(chunks,as_pandas_dataframe)
+
+    def follow(self,since=None,poll_interval=0.1,timeout=None,as_pandas_dataframe=True):
+        """Yields the rows appended to the time series as they arrive
+
+        Starts after the current last row, or after `since` (a datetime or int64 milliseconds) if it
+        is given. The generator polls every `poll_interval` seconds and yields all rows appended
+        since its previous poll, as one DataFrame (or structured array). It tracks the partition it
+        has read up to and how many of its rows it has seen, so each poll only compares `nrows` and
+        looks for newer partitions, without re-reading or re-walking the rest of the time series.
+        If `timeout` is given, the generator stops after `timeout` seconds without new rows.
+
+        Each poll holds the file's lock (see `tstables.locks.file_lock`), so a writer in another
+        thread can append to the same open file while holding that lock, for example through
+        `AsyncTsTable`.
+        """
+
+        # Find the starting position here rather than in a generator, so that rows appended after
+        # this call returns are followed even if the generator hasn't been started yet
+        lock = locks.file_lock(self.file)
+        with lock:
+            if since is None:
+                chunks,cursor = [],(datetime.date.min,0)
+                for partition_dt,ts_data in self.__iter_nonempty_tables(reverse=True):
+                    cursor = (partition_dt,ts_data.nrows)
+                    break
+            else:
+                chunks,cursor = self.__read_since(since)
+
+        return self.__follow(lock,chunks,cursor,poll_interval,timeout,as_pandas_dataframe)
+
+    def __follow(self,lock,chunks,cursor,poll_interval,timeout,as_pandas_dataframe):
+        idle_since = time.monotonic()
+        while True:
+            if chunks:
+                yield self.__rows_from_chunks(chunks,as_pandas_dataframe)
+                idle_since = time.monotonic()
+            elif timeout is not None and time.monotonic() - idle_since >= timeout:
+                return
+            else:
+                time.sleep(poll_interval)
+
+            with lock:
+                chunks,cursor = self.__read_after_cursor(cursor)
+
+    def __read_since(self,last_ts):
+        """Returns the non-empty arrays of rows after last_ts, one per partition, and the cursor
+        (partition date, rows seen in it) at the end of them
+        """
+
+        if last_ts is None:
+            cursor = (datetime.date.min,0)
+        else:
+            if isinstance(last_ts,datetime.datetime):
+                if last_ts.tzinfo is None:
+                    last_ts = last_ts.replace(tzinfo=datetime.timezone.utc)
+                last_ts = self.__dt_to_ts(last_ts)
+
+            partition_dt = self.__ts_to_partition_date(last_ts)
+            ts_data = self.__fetch_partition_table(partition_dt)
+            seen = 0
+            if ts_data is not None and ts_data.nrows > 0:
+                seen = self.__search_timestamps(ts_data,last_ts,side='right')
+            cursor = (partition_dt,seen)
+
+        return self.__read_after_cursor(cursor)
+
+    def __read_after_cursor(self,cursor):
+        """Returns the non-empty arrays of rows after a cursor, one per partition, and the new cursor
+        """
+
+        cursor_dt,seen = cursor
+        chunks = []
+
+        ts_data = self.__fetch_partition_table(cursor_dt)
+        if ts_data is not None and ts_data.nrows > seen:
+            chunks.append(self.__read_table(ts_data,seen,ts_data.nrows))
+            seen = ts_data.nrows
+
+        if cursor_dt < datetime.date.max:
+            for partition_dt in self.__iter_partition_dates(
+                    first_dt=cursor_dt + datetime.timedelta(days=1)):
+                ts_data = self.__fetch_partition_table(partition_dt)
+                # Empty partitions (such as the one made by create_ts) don't move the cursor, since
+                # rows may still be appended to earlier partitions
+                if ts_data.nrows > 0:
+                    chunks.append(self.__read_table(ts_data))
+                    cursor_dt,seen = partition_dt,ts_data.nrows
+
+        return chunks,(cursor_dt,seen)
+
+    def __rows_from_chunks(self,chunks,as_pandas_dataframe):
+        result = numpy.concatenate([numpy.ndarray(shape=0,dtype=self.__v_dtype())] + chunks)
+
+        if as_pandas_dataframe:
+            result = self.__to_dataframe(result)
+
+        return result
+
+    def to_dask(self,start_dt,end_dt,columns=None):
+        """Returns the rows between start_dt and end_dt as a Dask DataFrame (which requires
+        dask[dataframe]), with one Dask partition per tstables partition
+
+        Each Dask task reads one partition. Tasks in other worker processes open the file
+        read-only by themselves, and tasks in this process read through this file under its lock
+        (see `tstables.locks.file_lock`). The divisions come from the partition boundaries, so Dask
+        knows the time range of every partition without reading it. `columns` selects a subset of
+        the columns. The file is flushed first; HDF5 may not let other processes open a file that
+        is still open for writing, so close it before computing on a process-based scheduler.
+        """
+
+        from tstables import dask
+        return dask.to_dask(self,start_dt,end_dt,columns)
+
+    def read_sample(self,start_dt,end_dt,n,method='stride',seed=None,as_pandas_dataframe=True):
+        """Returns a sample of at most `n` of the rows between start_dt and end_dt, in time order
+
+        With method='stride', every k-th row is returned, with k chosen so that there are at most
+        `n` of them, and each partition is read with `Table.read(start, stop, k)`. With
+        method='random', `n` rows are picked uniformly at random (using `seed`, if given), and only
+        those rows are read with `Table.read_coordinates`. Either way, partitions get a share of the
+        sample in proportion to their number of rows in the range. If there are no more than `n`
+        rows, they are all returned.
+        """
+
+        if n <= 0:
+            raise ValueError('n must be positive')
+        if method not in ('stride','random'):
+            raise ValueError("method must be 'stride' or 'random'")
+
+        start_dt,end_dt = self.__utc_range(start_dt,end_dt)
+        start_ts = self.__dt_to_ts(start_dt)
+        end_ts = self.__dt_to_ts(end_dt)
+
+        # The (table, start, stop) rows of each partition in the range
+        spans = []
+        for partition_dt,ts_data,covered in self.__iter_partitions_in_range(start_ts,end_ts):
+            if ts_data.nrows == 0:
+                continue
+            start_idx,end_idx = (0,ts_data.nrows) if covered else self.__row_span(ts_data,start_ts,end_ts)
+            if end_idx > start_idx:
+                spans.append((ts_data,start_idx,end_idx))
+
+        # Position of the first row of each span among all the rows in the range
+        offsets = numpy.cumsum([0] + [stop - start for ts_data,start,stop in spans])
+        total = offsets[-1]
+
+        chunks = []
+        if total <= n:
+            chunks = [self.__read_table(ts_data,start,stop) for ts_data,start,stop in spans]
+        elif method == 'stride':
+            step = -(-total // n)
+            for (ts_data,start,stop),offset in zip(spans,offsets):
+                # Continue the stride from the previous partition
+                first = start + (-offset) % step
+                if first < stop:
+                    chunks.append(self.__read_table(ts_data,first,stop,step))
+        else:
+            positions = numpy.sort(numpy.random.default_rng(seed).choice(total,size=n,replace=False))
+            bounds = numpy.searchsorted(positions,offsets)
+            for (ts_data,start,stop),offset,lo,hi in zip(spans,offsets,bounds[:-1],bounds[1:]):
+                if hi > lo:
+                    chunks.append(self.__decode_rows(ts_data,
+                        ts_data.read_coordinates(positions[lo:hi] - offset + start)))
+
+        return self.__rows_from_chunks(chunks,as_pandas_dataframe)
+
+    def __to_dataframe(self,rows):
+        """Turns a structured array of rows into a pandas DataFrame with a timeseries index
+        """
+
+        import pandas
+
+        return pandas.DataFrame.from_records(rows,
+            index=rows['timestamp'].astype('datetime64[ms]'),
+            exclude=['timestamp'])
+
+    # The aggregations supported by read_aggregate
+    AGGREGATIONS = ('first','last','min','max','sum','count','mean')
+
+    def read_aggregate(self,start_dt,end_dt,freq,aggregations,as_pandas_dataframe=True):
+        """Aggregates the rows between start_dt and end_dt into fixed-size time buckets
+
+        `freq` is the bucket size, as a timedelta or a number of milliseconds. Buckets are aligned
+        to the epoch, and only buckets with rows appear in the result. `aggregations` maps column
+        names to an aggregation or a list of aggregations from `TsTable.AGGREGATIONS`, for example
+        {'price': ['first','max','min','last'], 'size': 'sum'}. An output column is named after
+        its input column when a single aggregation is given, or '<column>_<aggregation>' when a
+        list is given. The result is indexed by (or, as an array, has a `timestamp` column with) the
+        start of each bucket.
+
+        The rows are read one partition at a time and reduced with `numpy.ufunc.reduceat`, and a
+        bucket that spans partitions is merged across them, so memory use is proportional to the
+        number of buckets rather than the number of rows.
+        """
+
+        if isinstance(freq,datetime.timedelta):
+            freq = int(freq.total_seconds()*1000)
+        freq = numpy.int64(freq)
+        if freq <= 0:
+            raise ValueError('freq must be positive')
+
+        dtype = self.__v_dtype()
+
+        # (output column, input column, aggregation)
+        outputs = []
+        for column in sorted(aggregations.keys()):
+            if column not in dtype.names:
+                raise ValueError("no column named '%s'" % column)
+            aggs = aggregations[column]
+            for agg in ([aggs] if isinstance(aggs,str) else aggs):
+                if agg not in TsTable.AGGREGATIONS:
+                    raise ValueError("unknown aggregation '%s'" % agg)
+                name = column if isinstance(aggs,str) else '%s_%s' % (column,agg)
+                outputs.append((name,column,agg))
+
+        bucket_chunks = []
+        count_chunks = []
+        value_chunks = dict((name,[]) for name,column,agg in outputs)
+
+        for rows in self.iter_range(start_dt,end_dt,output='numpy'):
+            buckets = rows['timestamp'] // freq
+            starts = numpy.concatenate(([0],numpy.flatnonzero(buckets[1:] != buckets[:-1]) + 1))
+            ends = numpy.append(starts[1:],buckets.size)
+            counts = ends - starts
+
+            values = {}
+            for name,column,agg in outputs:
+                col = rows[column]
+                if agg == 'first':
+                    values[name] = col[starts]
+                elif agg == 'last':
+                    values[name] = col[ends-1]
+                elif agg == 'min':
+                    values[name] = numpy.minimum.reduceat(col,starts)
+                elif agg == 'max':
+                    values[name] = numpy.maximum.reduceat(col,starts)
+                elif agg == 'count':
+                    values[name] = counts
+                else:
+                    # 'sum', and 'mean', which is divided by the counts at the end
+                    values[name] = numpy.add.reduceat(col,starts,dtype=self.__sum_dtype(col.dtype))
+
+            # If the first bucket of this partition continues the last bucket of the previous one,
+            # merge it into that bucket
+            if bucket_chunks and bucket_chunks[-1][-1] == buckets[0]:
+                count_chunks[-1][-1] += counts[0]
+                for name,column,agg in outputs:
+                    prev = value_chunks[name][-1]
+                    if agg == 'last':
+                        prev[-1] = values[name][0]
+                    elif agg == 'min':
+                        prev[-1] = min(prev[-1],values[name][0])
+                    elif agg == 'max':
+                        prev[-1] = max(prev[-1],values[name][0])
+                    elif agg in ('sum','mean'):
+                        prev[-1] += values[name][0]
+                    elif agg == 'count':
+                        prev[-1] = count_chunks[-1][-1]
+                starts = starts[1:]
+                counts = counts[1:]
+                values = dict((name,v[1:]) for name,v in values.items())
+
+            if starts.size > 0:
+                bucket_chunks.append(buckets[starts])
+                count_chunks.append(counts.copy())
+                for name,column,agg in outputs:
+                    value_chunks[name].append(values[name].copy())
+
+        out_dtype = [('timestamp',numpy.int64)]
+        for name,column,agg in outputs:
+            if agg == 'count':
+                out_dtype.append((name,numpy.int64))
+            elif agg == 'mean':
+                out_dtype.append((name,numpy.float64))
+            elif agg == 'sum':
+                out_dtype.append((name,self.__sum_dtype(dtype[column])))
+            else:
+                out_dtype.append((name,dtype[column]))
+
+        n_buckets = sum(b.size for b in bucket_chunks)
+        result = numpy.ndarray(shape=n_buckets,dtype=out_dtype)
+        if n_buckets > 0:
+            result['timestamp'] = numpy.concatenate(bucket_chunks) * freq
+            counts = numpy.concatenate(count_chunks)
+            for name,column,agg in outputs:
+                result[name] = numpy.concatenate(value_chunks[name])
+                if agg == 'mean':
+                    result[name] /= counts
+
+        if as_pandas_dataframe:
+            result = self.__to_dataframe(result)
+
+        return result
+
+    @staticmethod
+    def __sum_dtype(dtype):
+        if dtype.kind == 'f':
+            return numpy.dtype(numpy.float64)
+        elif dtype.kind == 'u':
+            return numpy.dtype(numpy.uint64)
+        else:
+            return numpy.dtype(numpy.int64)
+
+    def read_asof(self,timestamps,as_pandas_dataframe=True):
+        """Returns, for each of the given timestamps, the last row at or before that timestamp
+
+        `timestamps` may be a sequence of datetimes, a datetime64 array (naive values are taken as
+        UTC) or an int64 array of milliseconds since the epoch. The rows are returned in the same
+        order as `timestamps`. When there is no row at or before a timestamp, the returned row is
+        zero-filled and its timestamp is set to the minimum int64 value (or, for a DataFrame, the
+        row is NaN).
+        """
+
+        query_ts = self.__to_ts_array(timestamps)
+
+        # Group the queries by partition by sorting them. A stable sort keeps query order for ties.
+        order = numpy.argsort(query_ts,kind='mergesort')
+        sorted_ts = query_ts[order]
+
+        result = numpy.zeros(shape=query_ts.size,dtype=self.__v_dtype())
+        result['timestamp'] = numpy.iinfo('int64').min
+        found = numpy.zeros(shape=query_ts.size,dtype=bool)
+
+        p_dates = list(self.__iter_partition_dates())
+        if query_ts.size > 0 and len(p_dates) > 0:
+            p_starts = numpy.array([self.__partition_start_ts(d) for d in p_dates],dtype=numpy.int64)
+
+            # Index of the partition that each (sorted) query timestamp falls into. -1 means the
+            # timestamp is before the first partition.
+            q_partitions = numpy.searchsorted(p_starts,sorted_ts,side='right') - 1
+            group_ids,group_starts = numpy.unique(q_partitions,return_index=True)
+            group_ends = numpy.append(group_starts[1:],sorted_ts.size)
+
+            # The last non-empty partition preceding the partition being processed, as an index into
+            # p_dates, and how far back we've already looked for it.
+            prev_nonempty = None
+            scanned_to = -1
+
+            for p_idx,g_start,g_end in zip(group_ids,group_starts,group_ends):
+                if p_idx < 0:
+                    continue
+
+                ts_data = self.__fetch_partition_table(p_dates[p_idx])
+                q_slice = order[g_start:g_end]
+
+                if ts_data.nrows > 0:
+                    row_idx = self.__search_timestamps(ts_data,sorted_ts[g_start:g_end],side='right') - 1
+                    matched = row_idx >= 0
+                    if matched.any():
+                        result[q_slice[matched]] = self.__decode_rows(ts_data,
+                            ts_data.read_coordinates(row_idx[matched]))
+                        found[q_slice[matched]] = True
+                else:
+                    matched = numpy.zeros(shape=g_end-g_start,dtype=bool)
+
+                if not matched.all():
+                    # Some queries are before the first row of this partition, so they resolve to the
+                    # last row of the previous non-empty partition
+                    for i in range(p_idx-1,scanned_to,-1):
+                        if self.__fetch_partition_table(p_dates[i]).nrows > 0:
+                            prev_nonempty = i
+                            break
+
+                    if prev_nonempty is not None:
+                        prev_data = self.__fetch_partition_table(p_dates[prev_nonempty])
+                        result[q_slice[~matched]] = self.__read_table(prev_data,prev_data.nrows-1,
+                                                                      prev_data.nrows)
+                        found[q_slice[~matched]] = True
+
+                if ts_data.nrows > 0:
+                    prev_nonempty = p_idx
+                scanned_to = p_idx
 
-        # Turn into a pandas DataFrame with a timeseries index
         if as_pandas_dataframe:
-            result = pandas.DataFrame.from_records(result,
-                index=result['timestamp'].astype('datetime64[ms]'),
+            import pandas
+            df = pandas.DataFrame.from_records(result,
+                index=query_ts.astype('datetime64[ms]'),
                 exclude=['timestamp'])
+            return df.where(numpy.broadcast_to(found[:,None],df.shape))
 
         return result
 
-    def append(self,rows,convert_strings=False):
+    def __to_ts_array(self,timestamps):
+        """Converts datetimes, datetime64 values or int64 milliseconds to an int64 ms array
+        """
+
+        ts_array = numpy.asarray(timestamps)
+        if ts_array.dtype.kind == 'M':
+            return ts_array.astype('datetime64[ms]').view(numpy.int64)
+        elif ts_array.dtype.kind in 'iu':
+            return ts_array.astype(numpy.int64)
+
+        ts_list = []
+        for dt in ts_array.ravel():
+            if dt.tzinfo is None:
+                dt = dt.replace(tzinfo=datetime.timezone.utc)
+            ts_list.append(self.__dt_to_ts(dt))
+        return numpy.array(ts_list,dtype=numpy.int64)
+
+    def append(self,rows,convert_strings=False,on_overlap='raise'):
+        """Appends rows (a structured array, a dict of column arrays or a DataFrame with a
+        DatetimeIndex) that are sorted by timestamp and start at or after the end of the existing rows
+
+        A structured array that already has the table dtype is not copied: each partition's slice of
+        it is passed to `Table.append` as a view.
+
+        With `on_overlap='skip_duplicates'`, rows may also overlap the end of the existing rows, as
+        when a batch is replayed. Rows that exactly match an existing row are dropped, and a
+        ValueError is raised if any other row is before the last existing row.
+        """
+
+        if on_overlap not in ('raise','skip_duplicates'):
+            raise ValueError("on_overlap must be 'raise' or 'skip_duplicates'")
+
+        wbufRA = self.__prepare_rows(rows,convert_strings)
+        if wbufRA.size == 0:
+            return # Do nothing if we are appending nothing
+
+        # We also need to confirm that the rows are sorted by timestamp. This is an additional
+        # constraint of TsTables.
+        if not self.__is_sorted(wbufRA['timestamp']):
+            raise ValueError("timestamp column must be sorted in ascending order.")
+
+        # Array is confirmed sorted at this point, so min and max are easy to get
+        min_ts = wbufRA[0][0]
+        max_ts = wbufRA[-1][0]
+
+        existing_max_ts = self.__get_max_ts()
+
+        if on_overlap == 'skip_duplicates' and existing_max_ts is not None and min_ts <= existing_max_ts:
+            wbufRA = self.__drop_duplicate_rows(wbufRA,existing_max_ts)
+            if wbufRA.size == 0:
+                return
+            min_ts = wbufRA[0][0]
+
+        # Confirm that min is >= to the TsTable's max_ts
+        if min_ts < (existing_max_ts or numpy.iinfo('int64').min):
+            raise ValueError("rows start prior to the end of existing rows, so they cannot be "
+                             "appended.")
+
+        # wbufRA is ready to be inserted at this point. Chop it up into partitions.
+        sorted_pkeys,split_on_idx = self.__partition_splits(wbufRA['timestamp'])
+
+        # Now, split the array
+        split_wbufRA = numpy.split(wbufRA,split_on_idx)
+
+        # Save each partition
+        for idx,p in enumerate(sorted_pkeys):
+            self.__append_rows_to_partition(p,split_wbufRA[idx])
+
+    def __prepare_rows(self,rows,convert_strings):
+        """Converts the rows passed to append to a structured array in the table dtype
+
+        A one-dimensional structured array that already has the table dtype is returned as it is,
+        and a dict of column arrays is copied once into a new structured array. Anything else is
+        converted the way PyTables converts rows, which can take several copies.
+        """
+
+        dtype = self.__v_dtype()
+
+        if isinstance(rows,numpy.ndarray) and rows.ndim == 1 and rows.dtype == dtype:
+            return rows
+
+        if isinstance(rows,dict):
+            return self.__rows_from_columns(rows,dtype)
+
         # This part is specific to pandas support. If rows is a pandas DataFrame, convert it to a
-        # format suitable to PyTables
-        if rows.__class__ == pandas.core.frame.DataFrame:
+        # format suitable to PyTables. If pandas hasn't been imported, rows can't be a DataFrame, so
+        # this never imports pandas itself.
+        pandas = sys.modules.get('pandas')
+        if pandas is not None and isinstance(rows,pandas.DataFrame):
             if rows.empty:
-                return # Do nothing if we are appending nothing
-            if rows.index.__class__ != pandas.tseries.index.DatetimeIndex:
+                return numpy.ndarray(shape=0,dtype=dtype)
+            if not isinstance(rows.index,pandas.DatetimeIndex):
                 raise ValueError('when rows is a DataFrame, the index must be a DatetimeIndex.')
 
             # Convert to records
-            records = rows.to_records(index=True,convert_datetime64=False)
+            records = rows.to_records(index=True)
 
             # Need to make two type conversions:
             # 1. Pandas stores strings internally as variable-length strings, which are converted to objects in NumPy
@@ -248,15 +1001,13 @@ class TsTable:
             #    set to True.
             # 2. Need to convert the timestamp to datetime64[ms] (milliseconds)
 
-            dest_dtype = self.__fetch_first_table().description._v_dtype
-
             new_descr = []
             existing_descr = records.dtype.descr
 
             for idx,d in enumerate(existing_descr):
-                if existing_descr[idx][1] == '|O8' and dest_dtype[idx].char == 'S' and convert_strings:
+                if records.dtype[idx].kind == 'O' and dtype[idx].char == 'S' and convert_strings:
                     # records dtype is something like |O8 and dest dt is a string
-                    new_descr.append((existing_descr[idx][0], dest_dtype[idx]))
+                    new_descr.append((existing_descr[idx][0], dtype[idx]))
                 elif idx == 0:
                     # Make sure timestamp is in milliseconds
                     new_descr.append((existing_descr[idx][0], '<M8[ms]'))
@@ -273,53 +1024,269 @@ class TsTable:
             if iflavor != 'python':
                 rows = tables.flavor.array_as_internal(rows,iflavor)
 
-            wbufRA = numpy.rec.array(rows, dtype=self.__fetch_first_table().description._v_dtype)
+            wbufRA = numpy.rec.array(rows, dtype=dtype)
         except Exception as exc:
             raise ValueError("rows parameter cannot be converted into a recarray object compliant "
                              "with table '%s'.  The error was: <%s>" % (str(self), exc))
 
-        # Confirm that first column is Int64. This is an additional constraint of TsTables.     
+        # Confirm that first column is Int64. This is an additional constraint of TsTables.
         if not wbufRA.dtype[0] == numpy.dtype('int64'):
             raise ValueError("first column must be of type numpy.int64.")
 
-        # We also need to confirm that the rows are sorted by timestamp. This is an additional
-        # constraint of TsTables.
-        if not (numpy.diff(wbufRA['timestamp']) >= 0).all():
-            raise ValueError("timestamp column must be sorted in ascending order.")
+        return wbufRA
 
-        # Array is confirmed sorted at this point, so min and max are easy to get
-        min_ts = wbufRA[0][0]
-        max_ts = wbufRA[-1][0]
+    @staticmethod
+    def __rows_from_columns(columns,dtype):
+        """Builds a structured array in the table dtype from a dict that maps every column name to
+        an array of values. The timestamp column may be int64 milliseconds or datetime64 values.
+        """
 
-        # Confirm that min is >= to the TsTable's max_ts
-        if min_ts < (self.__get_max_ts() or numpy.iinfo('int64').min):
-            raise ValueError("rows start prior to the end of existing rows, so they cannot be "
-                             "appended.")
+        if set(columns.keys()) != set(dtype.names):
+            raise ValueError("the columns must be exactly the table columns: %s" % ', '.join(dtype.names))
 
-        # wbufRA is ready to be inserted at this point. Chop it up into partitions.
-        min_dt = self.__ts_to_dt(min_ts)
-        max_dt = self.__ts_to_dt(max_ts)
-        possible_partitions = self.__dtrange_to_partition_ranges(min_dt,max_dt)
+        timestamps = numpy.asarray(columns['timestamp'])
+        if timestamps.dtype.kind == 'M':
+            timestamps = timestamps.astype('datetime64[ms]').view(numpy.int64)
+
+        rows = numpy.empty(shape=len(timestamps),dtype=dtype)
+        rows['timestamp'] = timestamps
+        for name in dtype.names[1:]:
+            column = numpy.asarray(columns[name])
+            if len(column) != len(rows):
+                raise ValueError("all columns must have the same length")
+            rows[name] = column
+
+        return rows
+
+    @staticmethod
+    def __is_sorted(timestamps,block_size=1048576):
+        """Returns True if the timestamps are in ascending order
+
+        The comparison is done in blocks, so the temporary array it needs stays small.
+        """
+
+        for start in range(0,len(timestamps)-1,block_size):
+            stop = min(start+block_size,len(timestamps)-1)
+            if not (timestamps[start+1:stop+1] >= timestamps[start:stop]).all():
+                return False
+
+        return True
+
+    def __drop_duplicate_rows(self,rows,existing_max_ts):
+        """Removes the rows (sorted, and in the table dtype) that exactly match existing rows
+
+        Only the rows at or after the first timestamp of `rows` are read back, and the overlapping
+        rows are compared as raw bytes, all at once.
+        """
+
+        # Rows after the last existing row can't be duplicates
+        overlap_end = numpy.searchsorted(rows['timestamp'],existing_max_ts,side='right')
+        overlap = rows[:overlap_end]
+
+        chunks,cursor = self.__read_since(overlap['timestamp'][0] - 1)
+        existing = numpy.concatenate([numpy.ndarray(shape=0,dtype=rows.dtype)] + chunks)
 
-        sorted_pkeys = sorted(possible_partitions.keys())
+        row_type = numpy.dtype((numpy.void,rows.dtype.itemsize))
+        duplicate = numpy.isin(numpy.ascontiguousarray(overlap).view(row_type),
+                               numpy.ascontiguousarray(existing,dtype=rows.dtype).view(row_type))
+
+        return numpy.concatenate((overlap[~duplicate],rows[overlap_end:]))
+
+    def __partition_splits(self,timestamps):
+        """Returns the partitions spanned by a non-empty, sorted array of timestamps and, for each
+        partition, the index of the row after its last row
+        """
 
-        # For each partition, we are splitting on the end date
+        partition_dt = self.__ts_to_partition_date(timestamps[0])
+        last_dt = self.__ts_to_partition_date(timestamps[-1])
+
+        sorted_pkeys = []
         split_on_idx = []
-        for p in sorted_pkeys:
-            # p_max_ts is the maximum value of the timestamp column that SHOULD be included in this
-            # partition.
-            # We need to determine the row index of the row AFTER the last row where p_max_ts is <= to
-            # the timestamp.
-            p_max_ts = self.__dt_to_ts(possible_partitions[p][1])
-            split_on = numpy.searchsorted(wbufRA['timestamp'], p_max_ts, side='right')
-            split_on_idx.append(split_on)
+        while partition_dt <= last_dt:
+            # Split before the first row that belongs to the next partition
+            partition_dt_next = partition_dt + datetime.timedelta(days=1)
+            sorted_pkeys.append(partition_dt)
+            split_on_idx.append(numpy.searchsorted(timestamps,
+                self.__partition_start_ts(partition_dt_next),side='left'))
+            partition_dt = partition_dt_next
+
+        return sorted_pkeys,split_on_idx
+
+    def delete_range(self,start_dt,end_dt):
+        """Deletes the rows between start_dt and end_dt (inclusive), and returns how many were deleted
+
+        Partitions that are entirely in the range are removed with one `remove_node` each, and only
+        the partitions at the edges of the range have rows removed from them. Year and month
+        groups that are left empty are removed as well.
+        """
 
-        # Now, split the array
-        split_wbufRA = numpy.split(wbufRA,split_on_idx)
+        start_dt,end_dt = self.__utc_range(start_dt,end_dt)
+        start_ts = self.__dt_to_ts(start_dt)
+        end_ts = self.__dt_to_ts(end_dt)
 
-        # Save each partition
-        for idx,p in enumerate(sorted_pkeys):
-            self.__append_rows_to_partition(p,split_wbufRA[idx])
+        deleted = 0
+        last_removed_dt = None
+
+        # Removing partitions changes the groups being walked, so find the partitions first
+        for partition_dt,ts_data,covered in list(self.__iter_partitions_in_range(start_ts,end_ts)):
+            if covered:
+                deleted += ts_data.nrows
+                self.__remove_partition(partition_dt)
+                last_removed_dt = partition_dt
+            elif ts_data.nrows > 0:
+                start_idx,end_idx = self.__row_span(ts_data,start_ts,end_ts)
+                if end_idx > start_idx:
+                    ts_data.remove_rows(start_idx,end_idx)
+                    deleted += end_idx - start_idx
+
+            if self.cache is not None:
+                self.cache.invalidate(self.__cache_key(partition_dt))
+
+        # The partition tables are where the table description is stored, so the time series
+        # must keep at least one (possibly empty) partition
+        if last_removed_dt is not None and next(self.__iter_partition_dates(),None) is None:
+            self.__create_partition(last_removed_dt)
+
+        return deleted
+
+    def count_range(self,start_dt,end_dt):
+        """Returns the number of rows between start_dt and end_dt (inclusive), without reading them
+
+        Partitions that are entirely in the range are counted with `Table.nrows`, and only the
+        timestamp column of the (at most two) partitions at the edges of the range is read.
+        """
+
+        start_dt,end_dt = self.__utc_range(start_dt,end_dt)
+        start_ts = self.__dt_to_ts(start_dt)
+        end_ts = self.__dt_to_ts(end_dt)
+
+        count = 0
+        for partition_dt,ts_data,covered in self.__iter_partitions_in_range(start_ts,end_ts):
+            if covered:
+                count += ts_data.nrows
+            elif ts_data.nrows > 0:
+                start_idx,end_idx = self.__row_span(ts_data,start_ts,end_ts)
+                count += end_idx - start_idx
+
+        return int(count)
+
+    def coverage(self,start_dt,end_dt,resolution,gaps=False,as_pandas_dataframe=True):
+        """Returns the number of rows in each time bucket between start_dt and end_dt, or where the
+        gaps are
+
+        `resolution` is the bucket size, as a timedelta or a number of milliseconds. Buckets are
+        aligned to the epoch, like those of `read_aggregate`, but empty buckets are included. The
+        result is indexed by (or, as an array, has a `timestamp` column with) the start of each
+        bucket, and has a `count` column. With gaps=True, a list of (start, end) datetimes is
+        returned instead, one for each run of empty buckets, with inclusive ends clipped to the
+        range.
+
+        No rows are read. A partition that lies in a single bucket is counted with `Table.nrows`,
+        and otherwise only its timestamp column is read and bucketed.
+        """
+
+        if isinstance(resolution,datetime.timedelta):
+            resolution = int(resolution.total_seconds()*1000)
+        resolution = numpy.int64(resolution)
+        if resolution <= 0:
+            raise ValueError('resolution must be positive')
+
+        start_dt,end_dt = self.__utc_range(start_dt,end_dt)
+        start_ts = self.__dt_to_ts(start_dt)
+        end_ts = self.__dt_to_ts(end_dt)
+
+        first_bucket = start_ts // resolution
+        counts = numpy.zeros(end_ts // resolution - first_bucket + 1,dtype=numpy.int64)
+
+        for partition_dt,ts_data,covered in self.__iter_partitions_in_range(start_ts,end_ts):
+            if ts_data.nrows == 0:
+                continue
+
+            p_start_ts = self.__partition_start_ts(partition_dt)
+            p_end_ts = self.__partition_start_ts(partition_dt + datetime.timedelta(days=1)) - 1
+            if covered and p_start_ts // resolution == p_end_ts // resolution:
+                counts[p_start_ts // resolution - first_bucket] += ts_data.nrows
+                continue
+
+            timestamps = ts_data.col('timestamp')
+            if not covered:
+                start_idx,end_idx = self.__row_span(ts_data,start_ts,end_ts)
+                timestamps = timestamps[start_idx:end_idx]
+            if timestamps.size == 0:
+                continue
+
+            timestamps = timestamps.astype(numpy.int64)
+            if self.timestamp_encoding is not None:
+                timestamps += self.__timestamp_base(ts_data)
+
+            # Timestamps are sorted, so the buckets of a partition are a contiguous slice of counts
+            buckets = timestamps // resolution - first_bucket
+            counts[buckets[0]:buckets[-1]+1] += numpy.bincount(buckets - buckets[0])
+
+        if gaps:
+            # The start and end bucket of each run of empty buckets
+            edges = numpy.diff(numpy.concatenate(([0],(counts == 0).astype(numpy.int8),[0])))
+            return [(self.__ts_to_dt(max(start_ts,(first_bucket + lo)*resolution)),
+                     self.__ts_to_dt(min(end_ts,(first_bucket + hi + 1)*resolution - 1)))
+                    for lo,hi in zip(numpy.flatnonzero(edges == 1),numpy.flatnonzero(edges == -1) - 1)]
+
+        result = numpy.ndarray(shape=counts.size,dtype=[('timestamp',numpy.int64),('count',numpy.int64)])
+        result['timestamp'] = (first_bucket + numpy.arange(counts.size)) * resolution
+        result['count'] = counts
+
+        if as_pandas_dataframe:
+            result = self.__to_dataframe(result)
+
+        return result
+
+    def apply_retention(self,keep,now=None):
+        """Deletes the rows older than `keep` (a timedelta) before `now` (which defaults to the current
+        time), and returns how many were deleted
+        """
+
+        if now is None:
+            now = datetime.datetime.now(datetime.timezone.utc)
+        elif now.tzinfo is None:
+            now = now.replace(tzinfo=datetime.timezone.utc)
+
+        min_ts = self.__get_min_ts()
+        cutoff_ts = self.__dt_to_ts(now - keep)
+
+        if min_ts is None or min_ts >= cutoff_ts:
+            return 0
+
+        return self.delete_range(self.__ts_to_dt(min_ts),self.__ts_to_dt(cutoff_ts - 1))
+
+    def __remove_partition(self,partition_dt):
+        """Removes a partition, and its month and year groups if they are left empty
+        """
+
+        d_group = self.__fetch_partition_group(partition_dt)
+        m_group = d_group._v_parent
+        y_group = m_group._v_parent
+
+        self.file.remove_node(d_group,recursive=True)
+        if len(m_group._v_children) == 0:
+            self.file.remove_node(m_group)
+            if len(y_group._v_children) == 0:
+                self.file.remove_node(y_group)
+
+    def ingest(self,path,format='csv',chunk_rows=100000,**kwargs):
+        """Streams a CSV or Parquet file into the time series, `chunk_rows` rows at a time
+
+        Each chunk is parsed straight into the table dtype (with timestamps converted to int64
+        milliseconds) and appended, so files much larger than memory can be loaded. The file must
+        be sorted by timestamp and start at or after the end of the existing rows.
+
+        For CSV files, the file is assumed to have no header and to have the table's columns, in
+        order; other keyword arguments (and `timestamp_format`) are passed on to pandas.read_csv.
+        For Parquet files (which requires pyarrow), the columns are selected by name; pass
+        `columns` to map other column names, in table order.
+        """
+
+        for rows in readers.iter_chunks(path,self.__v_dtype(),format,chunk_rows,**kwargs):
+            if rows.size > 0:
+                self.append(rows)
 
     @staticmethod
     def __partition_date_to_path_array(partition_dt):
@@ -336,8 +1303,72 @@ class TsTable:
         """
 
         ts_data = self.__fetch_or_create_partition_table(partition_dt)
-        ts_data.append(rows)
+        encoded = self.__encode_rows(ts_data,rows)
+
+        # Index summaries are updated before the rows are written, so that if either fails, a
+        # summary can only have extra values (or be missing), which is safe
+        for column in self.indexed_columns:
+            summary = self.__index_summary(ts_data,column)
+            if summary is not None and len(rows) > 0:
+                self.__set_index_summary(ts_data,column,
+                    index.update_summary(summary,rows[column],self.table_expectedrows))
+
+        ts_data.append(encoded)
+
+        if self.cache is not None:
+            self.cache.invalidate(self.__cache_key(partition_dt))
     
+    @staticmethod
+    def __index_summary(ts_data,column):
+        """Returns the index summary of a column of a partition table, or None if the column isn't
+        indexed in this partition. Deleting rows doesn't update summaries, so they can only have
+        extra values, which is safe.
+
+        Summaries are stored as arrays next to the table, because HDF5 attributes are limited to
+        64 KB, which wide string columns and Bloom filters for many rows exceed.
+        """
+
+        children = ts_data._v_parent._v_children
+        if 'ts_distinct_' + column in children:
+            return ('distinct',children['ts_distinct_' + column].read())
+        elif 'ts_bloom_' + column in children:
+            return ('bloom',children['ts_bloom_' + column].read())
+
+        return None
+
+    @staticmethod
+    def __set_index_summary(ts_data,column,summary):
+        kind,data = summary
+        d_group = ts_data._v_parent
+        children = d_group._v_children
+        name = 'ts_%s_%s' % (kind,column)
+
+        # A Bloom filter keeps its size, so it's overwritten in place
+        if kind == 'bloom' and name in children and children[name].shape == data.shape:
+            children[name][:] = data
+            return
+
+        # Until the new summary is written, the column has none, so the partition is always read
+        for old_name in ('ts_distinct_' + column,'ts_bloom_' + column):
+            if old_name in children:
+                d_group._f_get_child(old_name)._f_remove()
+
+        ts_data._v_file.create_array(d_group,name,data)
+
+    def __may_match(self,ts_data,where):
+        """Returns False if the index of a partition shows it has no rows that match `where`
+        """
+
+        if ts_data is None or ts_data.nrows == 0:
+            return False
+
+        for column,value in where.items():
+            summary = self.__index_summary(ts_data,column)
+            if summary is not None and not index.may_contain(summary,value,ts_data.coldtypes[column]):
+                return False
+
+        return True
+
     def __fetch_partition_group(self,partition_dt):
         """Fetches a partition group, or returns `False` if the partition group does not exist
         """
@@ -348,6 +1379,16 @@ class TsTable:
         except (KeyError,tables.NoSuchNodeError):
             return False
 
+    def __fetch_partition_table(self,partition_dt):
+        """Fetches the data table of a partition, or returns `None` if the partition does not exist
+        """
+
+        group = self.__fetch_partition_group(partition_dt)
+        if group:
+            return group._f_get_child('ts_data')
+        else:
+            return None
+
     def __create_partition(self,partition_dt):
         """Creates partition, including parent groups (if they don't exist) and the data table
         """
@@ -374,12 +1415,23 @@ class TsTable:
             d_group = self.file.create_group(m_group,p_array[2])
 
         # We need to create the table in the day group
-        ts_data = self.file.create_table(d_group,'ts_data',self.table_description,self.table_title,
+        description = self.table_description
+        if self.timestamp_encoding is not None:
+            description = self.__stored_dtype()
+
+        ts_data = self.file.create_table(d_group,'ts_data',description,self.table_title,
             self.table_filters, self.table_expectedrows, self.table_chunkshape, self.table_byteorder)
 
         # Need to save this as an attribute because it doesn't seem to be saved anywhere
         ts_data.attrs._TS_TABLES_EXPECTEDROWS_PER_PARTITION = self.table_expectedrows
 
+        if self.timestamp_encoding is not None:
+            ts_data.attrs._TS_TABLES_TIMESTAMP_BASE = self.__partition_start_ts(partition_dt)
+
+        for column in self.indexed_columns:
+            self.__set_index_summary(ts_data,column,
+                ('distinct',numpy.ndarray(shape=0,dtype=ts_data.coldtypes[column])))
+
         return ts_data
 
     def __fetch_or_create_partition_table(self,partition_dt):